@@ -19,11 +19,19 @@ from PyQt5.QtWidgets import *
 
 # Local imports
 from data import DataHandler
+from qfolium import FoliumApplication, FoliumRenderer
+
+# The folium:// scheme has to be registered before the QApplication is created
+folium_app = FoliumApplication()
 
 
 class Ui_MainWindow(object):
-    def __init__(self):
-        self.html_files = []
+    def __init__(self, live_update=True):
+        # live_update: render the map once and only recolor it when the origin changes
+        self.live_update = live_update
+        # Origin selected while the page was loading, applied once it is loaded
+        self.page_loaded = False
+        self.pending_origin = None
         self.MainWindow = QtWidgets.QMainWindow()
         self.setupUi(self.MainWindow)
         self.load_data()
@@ -33,13 +41,19 @@ class Ui_MainWindow(object):
     def load_data(self):
         # Loading External Data
         self.dh = DataHandler(preprocess=False)
+        folium_app.register("origin_map")(self.render_map)
+
+        # Maps are rendered off the GUI thread and displayed once ready
+        self.renderer = FoliumRenderer(folium_app)
+        self.renderer.finished.connect(self.widget.load)
+        self.widget.loadStarted.connect(self.on_load_started)
+        self.widget.loadFinished.connect(self.on_load_finished)
 
         for n in self.dh.ngbh:
             self.comboOrigin.addItem(n)
 
     def load_map(self):
-        url = self.set_map()
-        self.widget.load(url)
+        self.set_map()
 
     def create_comboBoxes(self):
         # Initialising Combo Box
@@ -115,11 +129,7 @@ class Ui_MainWindow(object):
         """
         Closes the application.
         """
-        print(self.html_files)
-
-        with open("Code/app/cache/temp.txt", "w") as f:
-            for item in self.html_files:
-                f.write("%s\n" % item)
+        self.renderer.shutdown()
 
         # app.quit()
         # app.close()
@@ -128,33 +138,41 @@ class Ui_MainWindow(object):
 
         # sys.exit()
 
-    def set_map(self):
+    def render_map(self, origin, live_update):
+        if live_update:
+            return self.dh.get_base_map(origin)
+        return self.dh.get_map(origin)
 
+    def set_map(self):
+        # The map is rendered in memory by the background renderer and served through the folium:// scheme
         origin = self.comboOrigin.currentText()
-        m = self.dh.get_map(origin)
-
-        tmp_file = QtCore.QTemporaryFile(
-            "Code/app/cache/XXXXXX.html", self.centralwidget
+        self.renderer.request(
+            "origin_map", params={"origin": origin, "live_update": self.live_update}
         )
-        if tmp_file.open():
-            fileName = tmp_file.fileName()
-            m.save(fileName)
-            self.html_files.append(fileName)
-            print(self.html_files)
-            url = QtCore.QUrl.fromLocalFile(fileName)
-            self.widget.load(url)
 
-        print("Cannot open file.")
-        print(tmp_file.open())
+    def on_combobox_changed(self, value):
+        if self.live_update:
+            # Only the per-origin values are sent to the already rendered map
+            if self.page_loaded:
+                self.widget.page().runJavaScript(self.dh.get_update_script(value))
+            else:
+                self.pending_origin = value
+        else:
+            self.set_map()
 
-        return url
+    def on_load_started(self):
+        self.page_loaded = False
 
-    def on_combobox_changed(self, value):
-        self.set_map()
+    def on_load_finished(self, ok):
+        self.page_loaded = ok
+        if ok and self.live_update and self.pending_origin is not None:
+            origin, self.pending_origin = self.pending_origin, None
+            self.widget.page().runJavaScript(self.dh.get_update_script(origin))
 
 
 def main():
     app = QtWidgets.QApplication([])
+    folium_app.init_handler()
     ui = Ui_MainWindow()
     # ui.show()
     app.exec_()
@@ -172,13 +190,4 @@ if __name__ == "__main__":
 
     print("Successfully exited the application.")
 
-    # # Cleaning
-    # with open("Code/app/cache/temp.txt") as f:
-    #     html_files = f.read().splitlines()
-    # print(html_files)
-    # print(f"Deleting {len(html_files)} temporary files...")
-    # for f in html_files:
-    #     os.remove(f)
-
     # sys.exit()
-
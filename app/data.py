@@ -1,8 +1,11 @@
 # %%
 import pandas as pd
+import numpy as np
 import json
 from tqdm.auto import tqdm
 import folium
+import branca.colormap as cm
+from branca.element import MacroElement, Template
 import io
 import os
 
@@ -16,6 +19,10 @@ class DataHandler:
         # ChoroPleth Map
         return self.generate_map(origin)
 
+    def get_base_map(self, origin):
+        # Map recolored in place when the origin changes
+        return self.generate_base_map(origin)
+
     def load_data(self):
 
         # Proximus Data
@@ -27,42 +34,94 @@ class DataHandler:
         self.ngbh = self.df["originNB"].unique()
 
         # GeoJson Data
+        raw_path = os.path.join(
+            dir_name, "Code\data\maps\prox_neighbor\json\RBC_Neighborhoods_gps.json"
+        )
+        self.preprocessed_path = os.path.join(
+            dir_name,
+            "Code\data\maps\prox_neighbor\json\RBC_Neighborhoods_gps_preprocessed.json",
+        )
+        if not self.preprocess and not os.path.exists(self.preprocessed_path):
+            print("No preprocessed data found.")
+            self.preprocess = True
+
         if self.preprocess:
-            base_filename = (
-                "Code\data\maps\prox_neighbor\json\RBC_Neighborhoods_gps.json"
-            )
+            geo_json_path = raw_path
         else:
             print("Not preprocessing. Using already preprocessed data.")
-            base_filename = "Code\data\maps\prox_neighbor\json\RBC_Neighborhoods_gps_preprocessed.json"
-
-        geo_json_path = os.path.join(dir_name, base_filename)
+            geo_json_path = self.preprocessed_path
 
         with open(geo_json_path) as sectors_file:
             self.geojson = json.load(sectors_file)
 
+        self.build_od_matrix()
+
         if self.preprocess:
             self.pre_process_geojson()
 
+    def build_od_matrix(self):
+        """Groups the Proximus trips by origin once, into a dense origin x destination array.
+        Destinations follow the order of the geojson features.
+        """
+        self.destinations = [
+            feature["properties"]["NAME_FRE"] for feature in self.geojson["features"]
+        ]
+        self.origin_index = {origin: i for i, origin in enumerate(self.ngbh)}
+        destination_index = {dest: j for j, dest in enumerate(self.destinations)}
+
+        rows = self.df["originNB"].map(self.origin_index)
+        cols = self.df["destinationNB"].map(destination_index)
+        known = cols.notna()
+
+        self.od = np.zeros(
+            (len(self.ngbh), len(self.destinations)),
+            dtype=self.df["regularTripSample"].dtype,
+        )
+        self.od[
+            rows[known].to_numpy(dtype=int), cols[known].to_numpy(dtype=int)
+        ] = self.df.loc[known, "regularTripSample"].to_numpy()
+
+    def get_values(self, origin):
+        """Returns the number of regular trips from origin to each destination (geojson order)."""
+        return self.od[self.origin_index[origin]]
+
+    def get_update_script(self, origin):
+        """Returns the JavaScript call recoloring a map built by generate_base_map for a new origin.
+
+        Only the colors, labels and legend of the 145 neighborhoods are sent, the geometry is left untouched.
+        """
+        values = self.get_values(origin)
+        vmax = max(values.max(), 1)
+        colormap = cm.linear.YlOrRd_06.scale(0, vmax)
+        colors = {dest: colormap(val) for dest, val in zip(self.destinations, values)}
+        labels = {
+            dest: f"{dest}<br>Regular Trips From {origin}: {val:g}"
+            for dest, val in zip(self.destinations, values)
+        }
+        legend = {
+            "title": f"Regular Trips from {origin}",
+            "colors": [colormap(x) for x in np.linspace(0, vmax, 6)],
+            "vmax": float(vmax),
+        }
+        return f"updateChoropleth({json.dumps(colors)}, {json.dumps(labels)}, {json.dumps(legend)});"
+
     def pre_process_geojson(self):
         """This functions adds the features (ex. Number of regular trips) from each origin to each destination into the geojson file.
+
+        The values are read from the dense origin x destination array and written in a single pass over the features.
+        The result is saved so that later runs can use preprocess=False.
         """
         print("Preprocessing the original dataset...")
-        for origin in tqdm(self.df["originNB"].unique()):
-            # Adding the population value to each sector of the geojson file
-            subdf = self.df[self.df["originNB"] == origin]
-            for index in range(len(self.geojson["features"])):
-                temp_dict = self.geojson["features"][index]["properties"]
-                val = subdf[subdf["destinationNB"] == temp_dict["NAME_FRE"]][
-                    "regularTripSample"
-                ]
-                if val.empty:
-                    val = 0
-                else:
-                    val = val.item()
-                temp_dict[
+        for j, feature in enumerate(tqdm(self.geojson["features"])):
+            properties = feature["properties"]
+            for origin, i in self.origin_index.items():
+                properties[
                     f"RegularTrips_From_{origin}"
-                ] = f"Regular Trips From {origin}: " + str(val)
-                self.geojson["features"][index]["properties"] = temp_dict
+                ] = f"Regular Trips From {origin}: {self.od[i, j]}"
+
+        with open(self.preprocessed_path, "w") as f:
+            json.dump(self.geojson, f)
+        print("Successfully saved preprocessed geojson.")
 
     def generate_map(self, origin):
 
@@ -111,6 +170,256 @@ class DataHandler:
 
         return world
 
+    def get_geometry(self):
+        """Returns the neighborhoods as a GeoJSON holding only the geometry and NAME_FRE,
+        without the per-origin properties added by the preprocessing.
+        """
+        return {
+            "type": "FeatureCollection",
+            "features": [
+                {
+                    "type": "Feature",
+                    "geometry": feature["geometry"],
+                    "properties": {"NAME_FRE": feature["properties"]["NAME_FRE"]},
+                }
+                for feature in self.geojson["features"]
+            ],
+        }
+
+    def export_prerender(self, output_dir, origin=None):
+        """Builds the maps of all the origins at once.
+
+        Writes to output_dir:
+            - sectors.geojson: the geometry of the neighborhoods, shared by all origins.
+            - od_values.json: origins, destinations and the origin x destination values.
+            - index.html: a single map loading both assets, with a selector to switch origin.
+
+        The assets are fetched by the page: the directory has to be served over HTTP
+        (ex. python -m http.server), browsers block fetch on file:// pages.
+
+        Args:
+            output_dir ([String]): Directory where the files are written.
+            origin ([String], optional): Origin shown when the map is opened. Defaults to the first origin.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        if origin is None:
+            origin = self.ngbh[0]
+
+        geometry = self.get_geometry()
+        values = {
+            "origins": [str(o) for o in self.ngbh],
+            "destinations": self.destinations,
+            "values": self.od.tolist(),
+        }
+
+        with open(os.path.join(output_dir, "sectors.geojson"), "w") as f:
+            json.dump(geometry, f)
+        with open(os.path.join(output_dir, "od_values.json"), "w") as f:
+            json.dump(values, f)
+
+        world = self.generate_base_map(None, "sectors.geojson")
+        OriginSelector("od_values.json", str(origin)).add_to(world)
+        world.save(os.path.join(output_dir, "index.html"))
+
+        print(f"Successfully exported the maps of {len(self.ngbh)} origins.")
+
+    def generate_base_map(self, origin, geometry=None):
+        """Renders the neighborhoods once, to be recolored in place with get_update_script.
+
+        Args:
+            origin ([String]): Origin shown when the map is first displayed (None to leave it blank).
+            geometry ([Dict or String], optional): GeoJSON to render, or the URL of a GeoJSON
+                asset fetched by the page (see SectorsAsset). Defaults to get_geometry().
+        """
+        if geometry is None:
+            geometry = self.get_geometry()
+
+        # initial map coordinates
+        coords = [50.84892175574389, 4.3514911042124345]
+
+        world = folium.Map(
+            location=[coords[0], coords[1]], zoom_start=12.45, tiles="openstreetmap"
+        )
+
+        # add tile layers to the map
+        tiles = [
+            "stamenwatercolor",
+            "cartodbpositron",
+            "openstreetmap",
+            "stamenterrain",
+        ]
+        for tile in tiles:
+            folium.TileLayer(tile).add_to(world)
+
+        if isinstance(geometry, str):
+            layer = SectorsAsset(geometry).add_to(world)
+        else:
+            layer = folium.GeoJson(
+                geometry,
+                style_function=lambda x: {
+                    "weight": 0.5,
+                    "color": "black",
+                    "fillColor": "white",
+                    "fillOpacity": 0.6,
+                },
+                control=False,
+            ).add_to(world)
+        initial = "" if origin is None else self.get_update_script(origin)
+        ChoroplethUpdater(layer, initial).add_to(world)
+
+        # create a layer control
+        folium.LayerControl().add_to(world)
+
+        return world
+
+
+class ChoroplethUpdater(MacroElement):
+    """Defines updateChoropleth(colors, labels, legend) on the page, recoloring a GeoJson layer
+    from dictionaries keyed by NAME_FRE and updating its legend.
+
+    The current colors are kept in the page and the hover highlight is restyled from them,
+    so that hovering a sector does not reset it to the style it was rendered with.
+    The hover events are bound on the layer itself, so they also apply to sectors added later.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var choroplethColors = {};
+
+            function styleSector(layer, highlight) {
+                layer.setStyle({
+                    weight: highlight ? 2 : 0.5,
+                    color: "black",
+                    fillColor: choroplethColors[layer.feature.properties.NAME_FRE] || "white",
+                    fillOpacity: highlight ? 0.8 : 0.6
+                });
+            }
+
+            {{ this.layer.get_name() }}.on("mouseover", function (e) { styleSector(e.layer, true); });
+            {{ this.layer.get_name() }}.on("mouseout", function (e) { styleSector(e.layer, false); });
+
+            var choroplethLegend = L.control({position: "bottomright"});
+            choroplethLegend.onAdd = function () {
+                var div = L.DomUtil.create("div");
+                div.style.cssText = "background: white; padding: 6px; font: 12px arial;";
+                return div;
+            };
+            choroplethLegend.addTo({{ this._parent.get_name() }});
+
+            function updateChoropleth(colors, labels, legend) {
+                choroplethColors = colors;
+                {{ this.layer.get_name() }}.eachLayer(function (layer) {
+                    styleSector(layer, false);
+                    layer.bindTooltip(labels[layer.feature.properties.NAME_FRE], {sticky: true});
+                });
+                if (legend) {
+                    choroplethLegend.getContainer().innerHTML = "<b>" + legend.title + "</b>"
+                        + "<div style='width: 240px; height: 10px; background: linear-gradient(to right, "
+                        + legend.colors.join(", ") + ");'></div>"
+                        + "<span>0</span><span style='float: right;'>" + legend.vmax + "</span>";
+                }
+            }
+            {{ this.initial }}
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, layer, initial=""):
+        super().__init__()
+        self._name = "ChoroplethUpdater"
+        self.layer = layer
+        self.initial = initial
+
+
+class SectorsAsset(MacroElement):
+    """GeoJSON layer of the neighborhoods whose geometry is fetched from a shared asset,
+    instead of being embedded in the page. sectorsLoaded resolves once it is displayed.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = L.geoJson(null, {
+                style: {weight: 0.5, color: "black", fillColor: "white", fillOpacity: 0.6}
+            }).addTo({{ this._parent.get_name() }});
+
+            var sectorsLoaded = fetch({{ this.url }})
+                .then(function (response) { return response.json(); })
+                .then(function (data) { {{ this.get_name() }}.addData(data); });
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, url):
+        super().__init__()
+        self._name = "SectorsAsset"
+        self.url = json.dumps(url)
+
+
+class OriginSelector(MacroElement):
+    """Adds a selector of the origin to a map holding a SectorsAsset and a ChoroplethUpdater.
+    The origin x destination values are fetched from a shared asset (see export_prerender)
+    and the colors are computed in the browser.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var odData = null;
+            var odPalette = {{ this.palette }};
+
+            function showOrigin(origin) {
+                var row = odData.values[odData.origins.indexOf(origin)];
+                var vmax = Math.max(1, Math.max.apply(null, row));
+                var colors = {}, labels = {};
+                odData.destinations.forEach(function (dest, j) {
+                    var k = Math.min(odPalette.length - 1, Math.floor(row[j] / vmax * odPalette.length));
+                    colors[dest] = odPalette[k];
+                    labels[dest] = dest + "<br>Regular Trips From " + origin + ": " + row[j];
+                });
+                updateChoropleth(colors, labels, {
+                    title: "Regular Trips from " + origin, colors: odPalette, vmax: vmax
+                });
+            }
+
+            var originControl = L.control({position: "topright"});
+            originControl.onAdd = function () {
+                var div = L.DomUtil.create("div");
+                var select = L.DomUtil.create("select", "", div);
+                odData.origins.forEach(function (origin) {
+                    var option = L.DomUtil.create("option", "", select);
+                    option.value = origin;
+                    option.text = origin;
+                });
+                select.value = {{ this.origin }};
+                select.onchange = function () { showOrigin(this.value); };
+                L.DomEvent.disableClickPropagation(div);
+                return div;
+            };
+
+            var odLoaded = fetch({{ this.url }}).then(function (response) {
+                return response.json();
+            });
+            Promise.all([sectorsLoaded, odLoaded]).then(function (results) {
+                odData = results[1];
+                originControl.addTo({{ this._parent.get_name() }});
+                showOrigin({{ this.origin }});
+            });
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, url, origin):
+        super().__init__()
+        self._name = "OriginSelector"
+        self.url = json.dumps(url)
+        self.origin = json.dumps(origin)
+        colormap = cm.linear.YlOrRd_06.scale(0, 1)
+        self.palette = json.dumps(
+            [colormap.rgb_hex_str(x) for x in np.linspace(0, 1, 6)]
+        )
+
 
 # %%
 if __name__ == "__main__":
@@ -1,5 +1,8 @@
 import json
 import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from PyQt5 import QtCore, QtWebEngineCore, QtWebEngineWidgets
 
@@ -12,13 +15,10 @@ class FoliumSchemeHandler(QtWebEngineCore.QWebEngineUrlSchemeHandler):
     def requestStarted(self, request):
         url = request.requestUrl()
         name = url.host()
-        m = self.m_app.process(name, url.query())
-        if m is None:
+        raw_html = self.m_app.render(name, self.m_app.parse_query(url.query()))
+        if raw_html is None:
             request.fail(QtWebEngineCore.QWebEngineUrlRequestJob.UrlNotFound)
             return
-        data = io.BytesIO()
-        # m.save(data, close_file=False)
-        raw_html = data.getvalue()
         buf = QtCore.QBuffer(parent=self)
         request.destroyed.connect(buf.deleteLater)
         buf.open(QtCore.QIODevice.WriteOnly)
@@ -31,11 +31,15 @@ class FoliumSchemeHandler(QtWebEngineCore.QWebEngineUrlSchemeHandler):
 class FoliumApplication(QtCore.QObject):
     scheme = b"folium"
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, cache_size=32):
         super().__init__(parent)
         scheme = QtWebEngineCore.QWebEngineUrlScheme(self.scheme)
         QtWebEngineCore.QWebEngineUrlScheme.registerScheme(scheme)
         self.m_functions = dict()
+        # LRU cache of rendered HTML bytes, keyed by (function, params)
+        self.m_cache = OrderedDict()
+        self.m_cache_size = cache_size
+        self.m_cache_lock = threading.Lock()
 
     def init_handler(self, profile=None):
         if profile is None:
@@ -55,16 +59,54 @@ class FoliumApplication(QtCore.QObject):
         return decorator
 
     def process(self, name, query):
+        return self.call(name, self.parse_query(query))
+
+    def call(self, name, params=None):
         f = self.m_functions.get(name)
         if f is None:
             print("not found")
             return
 
+        if params is not None:
+            return f(**params)
+        return f()
+
+    def parse_query(self, query):
         items = QtCore.QUrlQuery(query).queryItems()
         params_json = dict(items).get("json", None)
         if params_json is not None:
-            return f(**json.loads(params_json))
-        return f()
+            return json.loads(params_json)
+        return None
+
+    def render(self, name, params=None):
+        """Returns the HTML of the map built by a registered function, rendered in memory.
+
+        Args:
+            name ([String]): Name of the registered function.
+            params ([Dict], optional): Keyword arguments of the function. Defaults to None.
+
+        Returns:
+            [Bytes]: HTML of the map, None if the function is unknown or returns no map.
+        """
+        key = (name, json.dumps(params, sort_keys=True))
+        with self.m_cache_lock:
+            if key in self.m_cache:
+                self.m_cache.move_to_end(key)
+                return self.m_cache[key]
+
+        # Rendering happens outside the lock, it may run in a FoliumRenderer thread
+        m = self.call(name, params)
+        if m is None:
+            return None
+        data = io.BytesIO()
+        m.save(data, close_file=False)
+        raw_html = data.getvalue()
+
+        with self.m_cache_lock:
+            self.m_cache[key] = raw_html
+            if len(self.m_cache) > self.m_cache_size:
+                self.m_cache.popitem(last=False)
+        return raw_html
 
     def create_url(self, name, params=None):
         url = QtCore.QUrl()
@@ -76,3 +118,62 @@ class FoliumApplication(QtCore.QObject):
             query.addQueryItem("json", params_json)
             url.setQuery(query)
         return url
+
+
+class FoliumRenderer(QtCore.QObject):
+    """Renders the maps of a FoliumApplication in a background thread.
+
+    Requests are coalesced: while a map is being rendered only the latest request is kept,
+    and a render superseded by a newer request (or cancelled) is not displayed.
+    """
+
+    # folium:// url of a map ready in the cache of the application
+    finished = QtCore.pyqtSignal(object)
+
+    def __init__(self, app, parent=None):
+        super().__init__(parent)
+        self.m_app = app
+        self.m_executor = ThreadPoolExecutor(max_workers=1)
+        self.m_lock = threading.Lock()
+        self.m_generation = 0
+        self.m_pending = None
+        self.m_running = False
+
+    def request(self, name, params=None):
+        with self.m_lock:
+            self.m_generation += 1
+            self.m_pending = (self.m_generation, name, params)
+            if self.m_running:
+                return
+            self.m_running = True
+        self.m_executor.submit(self._run)
+
+    def cancel(self):
+        with self.m_lock:
+            self.m_generation += 1
+            self.m_pending = None
+
+    def shutdown(self):
+        self.cancel()
+        self.m_executor.shutdown(wait=False)
+
+    def _run(self):
+        while True:
+            with self.m_lock:
+                if self.m_pending is None:
+                    self.m_running = False
+                    return
+                generation, name, params = self.m_pending
+                self.m_pending = None
+
+            try:
+                raw_html = self.m_app.render(name, params)
+            except Exception as e:
+                print(f"Rendering of {name} failed: {e}")
+                continue
+
+            with self.m_lock:
+                stale = generation != self.m_generation
+            if raw_html is not None and not stale:
+                # Queued to the GUI thread by Qt
+                self.finished.emit(self.m_app.create_url(name, params))
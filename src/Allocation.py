@@ -0,0 +1,261 @@
+import time
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.spatial import cKDTree
+
+# Local packages
+from GeoJsonHandler import GeoJsonHandler
+from OSMGeoJsonHandler import OSMGeoJsonHandler
+
+OBJECTIVES = ["p-median", "coverage"]
+
+
+class ChargingAllocator:
+    """Placement of charging stations among candidate sites, to serve the demand of the sectors.
+
+    Sites and sector centers are projected once and the site x sector pairs closer than a
+    radius are found with a KD-tree, giving a sparse distance matrix. The placement is solved
+    with a greedy heuristic followed by a swap local search:
+        - "p-median" minimizes the demand-weighted distance from each sector to its closest open site
+          (sectors out of reach of every open site count as being at the radius).
+        - "coverage" maximizes the demand of the sectors within the radius of an open site.
+    """
+
+    def __init__(
+        self,
+        sectors: GeoJsonHandler,
+        sites: OSMGeoJsonHandler,
+        demand="totalDemand",
+        radius=1000,
+    ):
+        """
+        Args:
+            sectors (GeoJsonHandler): Sectors, with their CENTER_LONG, CENTER_LAT and demand properties.
+            sites (OSMGeoJsonHandler): Candidate sites (ex. parkings or fuel stations), with LON and LAT.
+            demand (str, optional): Property of the sectors giving their demand. Defaults to "totalDemand".
+            radius (int, optional): Service radius in meters. Defaults to 1000.
+        """
+        self.sectors = sectors
+        self.sites = sites
+        self.radius = radius
+        self.demand = sectors.gdf[demand].to_numpy(dtype=float)
+        self.selected = None
+        # Status, cost, bound and optimality gap of the last exact solve
+        self.solution = None
+
+        sector_xy = _project(sectors.gdf["CENTER_LONG"], sectors.gdf["CENTER_LAT"])
+        site_xy = _project(sites.gdf["LON"], sites.gdf["LAT"])
+        self.site, self.sector, self.distance = _pairs(site_xy, sector_xy, radius)
+        self.matrix = sparse.csr_matrix(
+            (self.distance, (self.site, self.sector)),
+            shape=(len(site_xy), len(sector_xy)),
+        )
+
+    def solve(
+        self, p, objective="p-median", local_search=True, max_iter=100, verbose=True
+    ):
+        """Selects p sites.
+
+        Args:
+            p ([Int]): Number of sites to open.
+            objective (str, optional): "p-median" or "coverage". Defaults to "p-median".
+            local_search (bool, optional): Improve the greedy solution by swaps. Defaults to True.
+            max_iter (int, optional): Maximum number of swap passes. Defaults to 100.
+
+        Returns:
+            [ndarray]: Positions (in sites.gdf) of the selected sites.
+        """
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective: {objective}")
+
+        start = time.time()
+        # Both objectives minimize sum(demand * cost to the closest open site)
+        if objective == "p-median":
+            cost, unserved = self.distance, float(self.radius)
+        else:
+            cost, unserved = np.zeros_like(self.distance), 1.0
+
+        selected = self._greedy(p, cost, unserved)
+        if local_search:
+            selected = self._swap(selected, cost, unserved, max_iter)
+        self.selected = np.array(selected)
+
+        if verbose:
+            value = self.objective(self.selected, cost, unserved)
+            print(
+                f"Successfully selected {len(selected)} sites ({objective} cost: {value:.2f}, {time.time() - start:.2f}s)."
+            )
+        return self.selected
+
+    def solve_exact(
+        self, p, capacity=None, time_limit=60, warm_start=True, verbose=True
+    ):
+        """Selects at most p sites by solving a (capacitated) p-median facility location MILP
+        with python-mip (CBC), only creating assignment variables for the pairs within the radius.
+
+            min  sum demand_j * distance_ij * x_ij + sum demand_j * radius * u_j
+            s.t. sum_i x_ij + u_j = 1                       for each sector j
+                 x_ij <= y_i                                for each pair (i, j)
+                 sum_j demand_j * x_ij <= capacity * y_i    for each site i
+                 sum_i y_i <= p
+
+        Args:
+            p ([Int]): Maximum number of sites to open.
+            capacity ([Float], optional): Demand that one site can serve. Defaults to None (uncapacitated).
+            time_limit (int, optional): Time limit of the solver in seconds. Defaults to 60.
+            warm_start (bool, optional): Start from the greedy + swap solution. Defaults to True.
+
+        Returns:
+            [ndarray]: Positions (in sites.gdf) of the selected sites. The solver status, cost,
+            best bound and optimality gap are stored in self.solution.
+        """
+        try:
+            import mip
+        except ImportError as error:
+            raise ImportError(
+                "The exact allocation backend requires python-mip (pip install mip)."
+            ) from error
+
+        start = time.time()
+        sites = np.unique(self.site)
+        weights = self.demand[self.sector]
+
+        model = mip.Model(sense=mip.MINIMIZE, solver_name=mip.CBC)
+        model.verbose = 0
+        y = {i: model.add_var(var_type=mip.BINARY) for i in sites}
+        x = [model.add_var(lb=0, ub=1) for _ in range(len(self.site))]
+        u = [model.add_var(lb=0, ub=1) for _ in range(len(self.demand))]
+
+        model.objective = mip.xsum(
+            float(w * d) * var for w, d, var in zip(weights, self.distance, x)
+        ) + mip.xsum(float(w * self.radius) * var for w, var in zip(self.demand, u))
+
+        # Pairs grouped by sector and by site once, to build each constraint from its own pairs
+        by_sector = np.split(
+            np.argsort(self.sector, kind="stable"),
+            np.cumsum(np.bincount(self.sector, minlength=len(self.demand)))[:-1],
+        )
+        for j, pairs in enumerate(by_sector):
+            model += mip.xsum(x[k] for k in pairs) + u[j] == 1
+        for k, i in enumerate(self.site):
+            model += x[k] <= y[i]
+        if capacity is not None:
+            by_site = pd.Series(np.arange(len(self.site))).groupby(self.site)
+            for i, pairs in by_site:
+                model += (
+                    mip.xsum(float(weights[k]) * x[k] for k in pairs) <= capacity * y[i]
+                )
+        model += mip.xsum(y.values()) <= p
+
+        if warm_start:
+            greedy = self.solve(p, verbose=False)
+            model.start = [(y[i], 1.0 if i in greedy else 0.0) for i in sites]
+
+        status = model.optimize(max_seconds=time_limit)
+        if model.num_solutions == 0:
+            raise RuntimeError(f"No allocation found by the solver ({status.name}).")
+
+        self.selected = np.array([i for i in sites if y[i].x >= 0.5])
+        self.solution = {
+            "status": status.name,
+            "cost": model.objective_value,
+            "bound": model.objective_bound,
+            "gap": model.gap,
+            "seconds": time.time() - start,
+        }
+        if verbose:
+            print(
+                f"Successfully selected {len(self.selected)} sites ({status.name}, cost: {model.objective_value:.2f}, gap: {model.gap:.2%}, {self.solution['seconds']:.2f}s)."
+            )
+        return self.selected
+
+    def objective(self, selected, cost, unserved):
+        return float((self.demand * self._best(selected, cost, unserved)).sum())
+
+    def assignment(self):
+        """Returns the closest selected site of each sector (ID "" if out of reach) and its distance in meters."""
+        open_ = np.isin(self.site, self.selected)
+        order = np.lexsort((self.distance[open_], self.sector[open_]))
+        sector, site = self.sector[open_][order], self.site[open_][order]
+        distance = self.distance[open_][order]
+        first = np.unique(sector, return_index=True)[1]
+
+        ids = np.full(len(self.demand), "", dtype=object)
+        distances = np.full(len(self.demand), np.nan)
+        ids[sector[first]] = self.sites.gdf["ID"].to_numpy()[site[first]]
+        distances[sector[first]] = distance[first]
+        return pd.DataFrame(
+            {
+                self.sectors.name: self.sectors.gdf[self.sectors.name].to_numpy(),
+                "SITE": ids,
+                "DISTANCE": distances,
+            }
+        )
+
+    def _best(self, selected, cost, unserved):
+        # Cost of each sector to its closest selected site
+        best = np.full(len(self.demand), unserved)
+        open_ = np.isin(self.site, selected)
+        np.minimum.at(best, self.sector[open_], cost[open_])
+        return best
+
+    def _savings(self, best, cost):
+        # Decrease of the objective obtained by opening each site
+        weights = self.demand[self.sector] * np.maximum(best[self.sector] - cost, 0)
+        return np.bincount(self.site, weights=weights, minlength=self.matrix.shape[0])
+
+    def _greedy(self, p, cost, unserved):
+        selected = []
+        best = np.full(len(self.demand), unserved)
+        for _ in range(min(p, self.matrix.shape[0])):
+            savings = self._savings(best, cost)
+            savings[selected] = -1
+            site = int(np.argmax(savings))
+            selected.append(site)
+            pairs = self.site == site
+            np.minimum.at(best, self.sector[pairs], cost[pairs])
+        return selected
+
+    def _swap(self, selected, cost, unserved, max_iter):
+        selected = list(selected)
+        current = self.objective(selected, cost, unserved)
+        for _ in range(max_iter):
+            improved = False
+            for position in range(len(selected)):
+                # Best site to replace the one at this position
+                others = selected[:position] + selected[position + 1 :]
+                best = self._best(others, cost, unserved)
+                savings = self._savings(best, cost)
+                savings[others] = -1
+                candidate = int(np.argmax(savings))
+                value = float((self.demand * best).sum()) - savings[candidate]
+                if value < current - 1e-9 and candidate != selected[position]:
+                    selected[position] = candidate
+                    current = value
+                    improved = True
+            if not improved:
+                break
+        return selected
+
+
+def _project(long, lat):
+    points = gpd.GeoSeries(gpd.points_from_xy(long, lat), crs="EPSG:4326")
+    points = points.to_crs(OSMGeoJsonHandler.projected_crs)
+    return np.column_stack([points.x.to_numpy(), points.y.to_numpy()])
+
+
+def _pairs(site_xy, sector_xy, radius):
+    # All site x sector pairs closer than radius, as flat arrays
+    neighbors = cKDTree(site_xy).query_ball_point(sector_xy, radius)
+    counts = np.array([len(n) for n in neighbors], dtype=int)
+    site = (
+        np.concatenate([np.asarray(n, dtype=int) for n in neighbors])
+        if counts.sum()
+        else np.zeros(0, dtype=int)
+    )
+    sector = np.repeat(np.arange(len(sector_xy)), counts)
+    distance = np.hypot(*(site_xy[site] - sector_xy[sector]).T)
+    return site, sector, distance
@@ -1,9 +1,20 @@
 import folium
 import numpy as np
 import geopandas as gpd
+import shapely
+import pandas as pd
 import branca.colormap as cm
 from GeoJsonHandler import GeoJsonHandler
 
+# Simplification tolerance of each level, in degrees (1e-5 degree ~ 1 m in Brussels)
+SIMPLIFY_LEVELS = {"full": 0, "high": 0.00002, "medium": 0.0001, "low": 0.0005}
+
+# Level chosen automatically: (maximum number of shapes, level), coarser beyond
+AUTO_LEVELS = [(500, "full"), (2000, "high"), (10000, "medium")]
+
+# Level of the sectors when "auto" (~150 shapes, but with detailed borders)
+SECTORS_LEVEL = "high"
+
 
 class BrusselsMap:
     def __init__(
@@ -19,11 +30,61 @@ class BrusselsMap:
         self.height = height
         self.tiles = tiles
         self.tile = tile
+        self._simplified = dict()
         self.init_map()
         self.init_colors()
 
-        self.gdf = gpd.GeoDataFrame.from_features(self.geojson.geodata["features"])
-        self.gdf["geometry"] = self.gdf["geometry"].set_crs(epsg=4326)
+    @property
+    def gdf(self):
+        """[GeoDataFrame]: GeoDataFrame of the handler, shared (not copied) so that it follows its updates."""
+        return self.geojson.gdf
+
+    def simplified(self, geometry, level="auto"):
+        """Returns geometries simplified at the tolerance of a level.
+
+        Polygons are simplified as a coverage (shapely >= 2.1): the borders shared by
+        neighbouring shapes are simplified once, so that no gaps or overlaps open between
+        them. Older versions simplify each shape on its own, which opens gaps between
+        neighbours, so the levels are then limited to "high".
+
+        Only the levels of the sectors geometries are cached; other layers are simplified
+        on each call so that the map does not keep them alive.
+
+        Args:
+            geometry ([GeoSeries or GeoDataFrame]): Geometries to simplify (EPSG:4326).
+            level (str, optional): Key of SIMPLIFY_LEVELS, or "auto" to choose it from the number of shapes. Defaults to "auto".
+
+        Returns:
+            [GeoSeries]: Simplified geometries, aligned with the input.
+        """
+        if level == "auto":
+            level = _auto_level(len(geometry))
+        if SIMPLIFY_LEVELS[level] > SIMPLIFY_LEVELS["high"] and not hasattr(
+            shapely, "coverage_simplify"
+        ):
+            level = "high"
+        geoseries = gpd.GeoSeries(geometry.geometry)
+        if SIMPLIFY_LEVELS[level] == 0:
+            return geoseries
+        if geometry is not self.geojson.geometries:
+            return _simplify(geoseries, SIMPLIFY_LEVELS[level])
+
+        # The sectors geometries are rebuilt (new object) when the handler reloads them
+        cached = self._simplified.get(level)
+        if cached is None or cached[0] is not geometry:
+            cached = (geometry, _simplify(geoseries, SIMPLIFY_LEVELS[level]))
+            self._simplified[level] = cached
+        return cached[1]
+
+    def sectors_frame(self, columns, level="auto"):
+        """Returns columns of the sectors GeoDataFrame with their geometry simplified at a level
+        ("auto" is SECTORS_LEVEL: the sectors are too few for the automatic levels).
+        """
+        if level == "auto":
+            level = SECTORS_LEVEL
+        frame = pd.DataFrame(self.gdf[columns]).copy()
+        frame["geometry"] = self.simplified(self.geojson.geometries, level).values
+        return gpd.GeoDataFrame(frame, geometry="geometry", crs="EPSG:4326")
 
     def init_map(self):
         # Brussels coordinates
@@ -93,7 +154,7 @@ class BrusselsMap:
                 icon=folium.Icon(color=color, icon=icon, prefix="fa"),
             ).add_to(self.map)
 
-    def add_choropleth(self, data, legend=None, labels=False):
+    def add_choropleth(self, data, legend=None, labels=False, level="auto"):
         """This function adds a choropleth map on top of the Folium map. 
 
         Args:
@@ -103,6 +164,7 @@ class BrusselsMap:
                 - Column2: Values to assign to each region.
             legend ([Str], optional): Text to show near the legend. Defaults to None.
             labels ([Boolean]): Indicating whether or not add labels when mouse hover a region. Note that the geojson file has to have the value property.
+            level ([Str], optional): Simplification level of the shapes (see SIMPLIFY_LEVELS). Defaults to "auto".
 
             --- Reminder: Typical GeoJson Format:
             Dictionary FeatureCollection having for key 'features' a list of features.
@@ -117,9 +179,12 @@ class BrusselsMap:
         """
 
         colnames = list(data.columns)
+        properties = [self.geojson.name] + [
+            c for c in colnames[:2] if c != self.geojson.name and c in self.gdf.columns
+        ]
 
         choropleth = folium.Choropleth(
-            geo_data=self.geojson.geodata,
+            geo_data=self.sectors_frame(properties, level),
             data=data,
             columns=[colnames[0], colnames[1]],
             key_on=f"feature.properties.{colnames[0]}",
@@ -143,7 +208,13 @@ class BrusselsMap:
             )
 
     def add_choropleth_style2(
-        self, data, legend=None, nbr_steps=10, colormap_type="step", colormap=None
+        self,
+        data,
+        legend=None,
+        nbr_steps=10,
+        colormap_type="step",
+        colormap=None,
+        level="auto",
     ):
 
         colnames = list(data.columns)
@@ -181,11 +252,8 @@ class BrusselsMap:
             "weight": 0.1,
         }
 
-        dpop = gpd.GeoDataFrame.from_features(self.geojson.geodata["features"])
-        dpop["geometry"] = dpop["geometry"].set_crs(epsg=4326)
-
         NIL = folium.features.GeoJson(
-            data=self.geojson.gdf[["geometry", colnames[0], colnames[1]]],
+            data=self.sectors_frame([colnames[0], colnames[1]], level),
             style_function=style_function,
             control=False,
             highlight_function=highlight_function,
@@ -201,18 +269,58 @@ class BrusselsMap:
         colormap.add_to(self.map)
         self.map.add_child(NIL)
 
-    def build_sectors(self, data=None):
+    def add_geometries(self, data, column=None, level="auto", name=None, opacity=0.6):
+        """Adds a (large) layer of shapes as a single GeoJson layer, simplified at a level,
+        instead of one layer per shape. Shapes are colored by the categories of column.
+
+        Args:
+            data ([GeoDataFrame]): Shapes to draw (any CRS, reprojected to EPSG:4326), ex. the PRAS or TACS layers.
+            column ([Str], optional): Categorical column used for the colors and the tooltip. Defaults to None.
+            level ([Str], optional): Simplification level (see SIMPLIFY_LEVELS). Defaults to "auto".
+            name ([Str], optional): Name of the layer. Defaults to None.
+            opacity ([Float], optional): Fill opacity. Defaults to 0.6.
+        """
+        data = data.to_crs(epsg=4326)
+        frame = pd.DataFrame(data[[column]] if column else data[[]]).copy()
+        frame["geometry"] = self.simplified(data, level).values
+        frame = gpd.GeoDataFrame(frame, geometry="geometry", crs="EPSG:4326")
+
+        colors = dict()
+        if column:
+            categories = list(pd.unique(frame[column]))
+            colors = {
+                str(c): self.colors[i % len(self.colors)]
+                for i, c in enumerate(categories)
+            }
+            frame[column] = frame[column].astype(str)
+
+        style_function = lambda x: {
+            "weight": 0.25,
+            "color": "black",
+            "fillColor": colors.get(x["properties"].get(column), self.colors[0]),
+            "fillOpacity": opacity,
+        }
+
+        folium.GeoJson(
+            data=frame,
+            name=name,
+            style_function=style_function,
+            tooltip=folium.features.GeoJsonTooltip(fields=[column]) if column else None,
+        ).add_to(self.map)
+
+    def build_sectors(self, data=None, level="auto"):
         """
         Add the boundaries of a specific geoJson file. 
-        If no file is given, the geojson file attached to the BrusselsMaps object is used.
+        If no file is given, the geojson file attached to the BrusselsMaps object is used
+        (simplified at the given level, see SIMPLIFY_LEVELS).
         """
         if self.tiles:
             print(
                 "Warning: Tiles activated - cannot plot boundaries. \n Please deactivate tiles using 'tiles=False' tag during BrusselsMap initialization."
             )
 
-        if data == None:
-            data = self.geojson.geodata
+        if data is None:
+            data = self.sectors_frame([self.geojson.name], level)
 
         layer = folium.GeoJson(data=data, name="muni").add_to(self.map)
         self.map.fit_bounds(layer.get_bounds())
@@ -241,3 +349,20 @@ class BrusselsMap:
             "lightgray",
         ]
 
+
+def _simplify(geoseries, tolerance):
+    simplified = geoseries.simplify(tolerance, preserve_topology=True)
+    polygons = geoseries.geom_type.isin(["Polygon", "MultiPolygon"]).to_numpy()
+    if polygons.any() and hasattr(shapely, "coverage_simplify"):
+        # Shared borders simplified once for all the shapes
+        simplified[polygons] = shapely.coverage_simplify(
+            np.asarray(geoseries.values[polygons]), tolerance
+        )
+    return simplified
+
+
+def _auto_level(size):
+    for maximum, level in AUTO_LEVELS:
+        if size <= maximum:
+            return level
+    return "low"
@@ -0,0 +1,269 @@
+import numpy as np
+import pandas as pd
+
+# Local packages
+from GeoJsonHandler import GeoJsonHandler, normalize_name
+
+# IEA assumption on the consumption of an electric vehicle
+ENERGY_PER_KM = 0.22  # kWh/km
+
+TRIP_TYPES = ["regular", "irregular"]
+
+
+class DemandEstimator:
+    """Energy demand of the sectors, computed from origin x destination matrices.
+
+    Trips, distances and durations are stored as dense arrays whose rows (origins) and
+    columns (destinations) follow the order of the sectors, so that the demand of every
+    sector is a handful of array operations instead of long-format merges.
+
+    Sectors are keyed by GeoJsonHandler.names, as DistanceMatrix: the labels of the input
+    data are normalized the same way (normalize_name) before being matched.
+    """
+
+    def __init__(self, sectors: GeoJsonHandler):
+        """
+        Args:
+            sectors (GeoJsonHandler): Sectors giving the order of the rows and columns of the matrices.
+        """
+        self.sectors = sectors
+        self.keys = list(sectors.names)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.trips = dict()
+        self.distances = None
+        self.durations = None
+        self.ratios = pd.DataFrame(index=pd.Index(self.keys, name=sectors.name))
+
+    def load_trips(
+        self,
+        data,
+        origin="originNB",
+        destination="destinationNB",
+        columns=("regularTripSample", "irregularTripSample"),
+    ):
+        """Scatters long-format trips (one row per origin/destination pair) into dense matrices.
+
+        Args:
+            data ([DataFrame]): Trips, ex. the Proximus dataset.
+            origin (str, optional): Column of the origins. Defaults to "originNB".
+            destination (str, optional): Column of the destinations. Defaults to "destinationNB".
+            columns (tuple, optional): Columns of the trips, in the order of TRIP_TYPES.
+                Defaults to ("regularTripSample", "irregularTripSample").
+
+        Raises:
+            ValueError: If origins or destinations are not sectors (their trips would be lost).
+        """
+        rows = sector_positions(data[origin], self.index)
+        cols = sector_positions(data[destination], self.index)
+
+        for trip_type, column in zip(TRIP_TYPES, columns):
+            matrix = np.zeros((len(self.keys), len(self.keys)))
+            # Pairs appearing several times are summed
+            np.add.at(matrix, (rows, cols), data[column].to_numpy(dtype=float))
+            self.trips[trip_type] = matrix
+
+    def load_distances(self, data):
+        """Aligns a square origin x destination matrix of distances (km) on the sectors.
+
+        Args:
+            data ([DataFrame]): Distances indexed by origin, one column per destination.
+
+        Raises:
+            ValueError: If sectors are missing from the index or the columns of data.
+        """
+        self.distances = self._align(data)
+
+    def load_durations(self, data):
+        """Aligns a square origin x destination matrix of durations on the sectors.
+
+        Args:
+            data ([DataFrame]): Durations indexed by origin, one column per destination.
+
+        Raises:
+            ValueError: If sectors are missing from the index or the columns of data.
+        """
+        self.durations = self._align(data)
+
+    def add_ratios(self, data, columns):
+        """Adds per-sector ratios (ex. parking or INDR ratios) to the demand table.
+
+        Args:
+            data ([DataFrame]): DataFrame containing the key column of the sectors and the ratios.
+            columns ([Dict]): Column of data -> name in the demand table (ex. {"ratio": "INDR_Ratio"}).
+        """
+        keys = data[self.sectors.name].map(normalize_name)
+        values = data.assign(**{self.sectors.name: keys})
+        values = values.drop_duplicates(subset=self.sectors.name).set_index(
+            self.sectors.name
+        )[list(columns)]
+        values = values.reindex(self.ratios.index).fillna(0)
+        for column, name in columns.items():
+            self.ratios[name] = values[column].to_numpy()
+
+    def demand(self, energy_per_km=ENERGY_PER_KM):
+        """Computes, per destination sector, the trips, the travelled distance and the energy demand.
+
+        Args:
+            energy_per_km ([Float], optional): Consumption of a vehicle in kWh/km. Defaults to ENERGY_PER_KM.
+
+        Returns:
+            [DataFrame]: One row per sector (key column first) with the TripSample, Demand and
+            EnergyDemand of each trip type, travelDistance, totalDemand and the added ratios.
+        """
+        # Values of the name property, so that the table can be given to add_properties
+        result = {self.sectors.name: list(self.sectors.gdf[self.sectors.name])}
+        total = np.zeros(len(self.keys))
+
+        for trip_type in TRIP_TYPES:
+            result[f"{trip_type}TripSample"] = self.trips[trip_type].sum(axis=0)
+        result["travelDistance"] = self.distances.sum(axis=0)
+
+        for trip_type in TRIP_TYPES:
+            demand = (self.trips[trip_type] * self.distances).sum(axis=0)
+            result[f"{trip_type}Demand"] = demand
+            total += demand
+        result["totalDemand"] = total
+
+        for trip_type in TRIP_TYPES:
+            result[f"{trip_type}EnergyDemand"] = (
+                result[f"{trip_type}Demand"] * energy_per_km
+            )
+
+        if self.durations is not None:
+            for trip_type in TRIP_TYPES:
+                result[f"{trip_type}TravelTime"] = (
+                    self.trips[trip_type] * self.durations
+                ).sum(axis=0)
+
+        demand = pd.DataFrame(result)
+        for column in self.ratios.columns:
+            demand[column] = self.ratios[column].to_numpy()
+        return demand
+
+    def simulate(
+        self,
+        draws=1000,
+        distribution="poisson",
+        dispersion=10.0,
+        quantiles=(0.05, 0.5, 0.95),
+        chunk=100,
+        energy_per_km=ENERGY_PER_KM,
+        seed=None,
+    ):
+        """Propagates the sampling uncertainty of the trips to the energy demand by Monte-Carlo.
+
+        The trips are drawn around the observed counts, chunk draws at a time as a
+        draws x origin x destination array, so that the memory stays bounded.
+
+        Args:
+            draws (int, optional): Number of draws. Defaults to 1000.
+            distribution (str, optional): "poisson" or "negative_binomial". Defaults to "poisson".
+            dispersion ([Float], optional): Dispersion k of the negative binomial (variance = mu + mu^2 / k). Defaults to 10.0.
+            quantiles (tuple, optional): Quantiles computed for each sector. Defaults to (0.05, 0.5, 0.95).
+            chunk (int, optional): Number of draws generated at once. Defaults to 100.
+            energy_per_km ([Float], optional): Consumption of a vehicle in kWh/km. Defaults to ENERGY_PER_KM.
+            seed ([Int], optional): Seed of the generator. Defaults to None.
+
+        Returns:
+            [DataFrame]: One row per sector (key column first) with the mean and the quantiles of the
+            regular, irregular and total EnergyDemand (ex. totalEnergyDemand_q0.95).
+        """
+        if distribution not in ["poisson", "negative_binomial"]:
+            raise ValueError(f"Unknown distribution: {distribution}")
+
+        # One generator per trip type, so that the draws do not depend on chunk
+        rngs = {
+            trip_type: np.random.default_rng(child)
+            for trip_type, child in zip(
+                TRIP_TYPES, np.random.SeedSequence(seed).spawn(len(TRIP_TYPES))
+            )
+        }
+        energy = {
+            trip_type: np.empty((draws, len(self.keys))) for trip_type in TRIP_TYPES
+        }
+
+        for start in range(0, draws, chunk):
+            size = min(chunk, draws - start)
+            for trip_type in TRIP_TYPES:
+                mean = np.broadcast_to(
+                    self.trips[trip_type], (size,) + self.trips[trip_type].shape
+                )
+                rng = rngs[trip_type]
+                if distribution == "poisson":
+                    trips = rng.poisson(mean)
+                else:
+                    trips = rng.negative_binomial(
+                        dispersion, dispersion / (dispersion + mean)
+                    )
+                energy[trip_type][start : start + size] = (
+                    np.einsum("nod,od->nd", trips, self.distances) * energy_per_km
+                )
+        energy["total"] = sum(energy[trip_type] for trip_type in TRIP_TYPES)
+
+        result = {self.sectors.name: list(self.sectors.gdf[self.sectors.name])}
+        for trip_type, values in energy.items():
+            result[f"{trip_type}EnergyDemand_mean"] = values.mean(axis=0)
+            for q, value in zip(quantiles, np.quantile(values, quantiles, axis=0)):
+                result[f"{trip_type}EnergyDemand_q{q}"] = value
+        return pd.DataFrame(result)
+
+    def add_to_sectors(self, energy_per_km=ENERGY_PER_KM, verbose=True):
+        """Computes the demand and adds all its columns as properties of the sectors.
+
+        Returns:
+            [DataFrame]: The demand table (see demand).
+        """
+        demand = self.demand(energy_per_km)
+        self.sectors.add_properties(demand, list(demand.columns[1:]), verbose=verbose)
+        return demand
+
+    def _align(self, data):
+        return align_matrix(data, self.keys)
+
+
+def sector_positions(labels, index):
+    """Positions of sector labels, normalized with normalize_name before the lookup.
+
+    Args:
+        labels ([Series]): Labels of the sectors (ex. the origins of the trips).
+        index ([Dict]): Sector key -> position (ex. DemandEstimator.index).
+
+    Raises:
+        ValueError: If labels are not keys of index.
+
+    Returns:
+        [Numpy Array]: Position of each label.
+    """
+    positions = labels.map(normalize_name).map(index)
+    unknown = labels[positions.isna()]
+    if len(unknown):
+        raise ValueError(
+            f"{len(unknown)} rows with unknown sectors: {sorted(set(map(str, unknown)))}"
+        )
+    return positions.to_numpy(dtype=int)
+
+
+def align_matrix(data, keys):
+    """Aligns a square origin x destination matrix on sector keys, labels normalized with normalize_name.
+
+    Args:
+        data ([DataFrame]): Values indexed by origin, one column per destination.
+        keys ([List]): Sector keys giving the order of the rows and columns.
+
+    Raises:
+        ValueError: If sectors are missing from the index or the columns of data.
+
+    Returns:
+        [Numpy Array]: len(keys) x len(keys) matrix, missing values filled with 0.
+    """
+    data = data.rename(index=normalize_name, columns=normalize_name)
+    missing = [key for key in keys if key not in data.index] + [
+        key for key in keys if key not in data.columns
+    ]
+    if missing:
+        raise ValueError(
+            f"Sectors missing from the origin x destination matrix: {sorted(set(missing))}"
+        )
+    # All the sectors are present: only genuine missing values are filled
+    matrix = data.reindex(index=keys, columns=keys)
+    return matrix.fillna(0).to_numpy(dtype=float)
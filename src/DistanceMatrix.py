@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+# Local packages
+from GeoJsonHandler import GeoJsonHandler
+
+EARTH_RADIUS = 6371.0088  # km
+
+# Ratio between road and great-circle distances (see the DemandMatrix notebook)
+DETOUR_FACTOR = 1.417
+
+
+class DistanceMatrix:
+    """Offline origin x destination distance (km) and duration (minutes) matrices between
+    the centers of the sectors, replacing the routing API queries of the DemandMatrix notebook.
+
+    Distances are either great-circle distances times a detour factor, or shortest paths
+    over the OSM lanes. Matrices are cached in .npz files keyed by a hash of the sectors
+    and of the parameters.
+    """
+
+    def __init__(
+        self,
+        sectors: GeoJsonHandler,
+        detour_factor=DETOUR_FACTOR,
+        speed=30,
+        cache_dir=None,
+    ):
+        """
+        Args:
+            sectors (GeoJsonHandler): Sectors, with their CENTER_LONG and CENTER_LAT properties.
+            detour_factor ([Float], optional): Road / great-circle distance ratio. Defaults to DETOUR_FACTOR.
+            speed ([Float], optional): Average speed in km/h used for the durations. Defaults to 30.
+            cache_dir ([String], optional): Directory of the cached matrices. Defaults to None.
+        """
+        self.sectors = sectors
+        # Same sector keys as DemandEstimator
+        self.names = sectors.names
+        self.long = sectors.gdf["CENTER_LONG"].to_numpy(dtype=float)
+        self.lat = sectors.gdf["CENTER_LAT"].to_numpy(dtype=float)
+        self.detour_factor = detour_factor
+        self.speed = speed
+        self.cache_dir = cache_dir
+
+    def build(self, lanes=None):
+        """Returns the distance and duration matrices, from the cache when possible.
+
+        Args:
+            lanes ([GeoDataFrame], optional): OSM lanes (ex. OSMGeoJsonHandler("lanes").gdf). If given,
+                distances are shortest paths over the lanes, otherwise great-circle distances. Defaults to None.
+
+        Returns:
+            [Tuple]: Distances (km) and durations (minutes), as square ndarrays in the order of the sectors.
+        """
+        cache_path = self.cache_path(lanes)
+        if cache_path is not None and os.path.exists(cache_path):
+            with np.load(cache_path) as cached:
+                return cached["distances"], cached["durations"]
+
+        if lanes is None:
+            distances = self.great_circle() * self.detour_factor
+        else:
+            distances = self.shortest_paths(lanes)
+        durations = distances / self.speed * 60
+
+        if cache_path is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            np.savez(cache_path, distances=distances, durations=durations)
+        return distances, durations
+
+    def to_frames(self, lanes=None):
+        """Returns the matrices as DataFrames indexed by origin, one column per destination,
+        in the format of DemandClusters-ODMatrix-Km.csv and DemandClusters-ODMatrix-Minutes.csv.
+        """
+        distances, durations = self.build(lanes)
+        index = pd.Index(self.names, name="origin")
+        return (
+            pd.DataFrame(distances, index=index, columns=self.names),
+            pd.DataFrame(durations, index=index, columns=self.names),
+        )
+
+    def great_circle(self):
+        """Haversine distances (km) between all the centers, in one broadcast."""
+        return haversine(
+            self.long[:, None], self.lat[:, None], self.long[None, :], self.lat[None, :]
+        )
+
+    def shortest_paths(self, lanes):
+        """Shortest path distances (km) over the lanes between the nodes closest to the centers.
+
+        Pairs that are not connected by the lanes get the great-circle distance times the detour factor.
+        """
+        graph, nodes = _lanes_graph(lanes)
+
+        # Snap each center to its closest node (longitudes scaled to be comparable to latitudes)
+        scale = np.cos(np.radians(self.lat.mean()))
+        tree = cKDTree(np.column_stack([nodes[:, 0] * scale, nodes[:, 1]]))
+        _, closest = tree.query(np.column_stack([self.long * scale, self.lat]))
+        access = haversine(self.long, self.lat, nodes[closest, 0], nodes[closest, 1])
+
+        distances = self.great_circle() * self.detour_factor
+        for i, source in enumerate(closest):
+            lengths = nx.single_source_dijkstra_path_length(
+                graph, source, weight="weight"
+            )
+            for j, target in enumerate(closest):
+                if i != j and target in lengths:
+                    distances[i, j] = access[i] + lengths[target] + access[j]
+        return distances
+
+    def cache_path(self, lanes=None):
+        if self.cache_dir is None:
+            return None
+
+        key = json.dumps(
+            [
+                self.names,
+                np.round(self.long, 6).tolist(),
+                np.round(self.lat, 6).tolist(),
+                self.detour_factor,
+                self.speed,
+            ]
+        ).encode()
+        sha1 = hashlib.sha1(key)
+        if lanes is not None:
+            sha1.update(
+                pd.util.hash_pandas_object(lanes.geometry.to_wkb(), index=False)
+                .to_numpy()
+                .tobytes()
+            )
+        return os.path.join(self.cache_dir, f"{sha1.hexdigest()[:16]}.npz")
+
+
+def haversine(long1, lat1, long2, lat2):
+    """Great-circle distance (km) between points given in degrees (broadcasts like NumPy)."""
+    long1, lat1, long2, lat2 = map(np.radians, (long1, lat1, long2, lat2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((long2 - long1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+def _lanes_graph(lanes):
+    # Nodes are the vertices of the lanes, merged when they share their coordinates
+    graph = nx.Graph()
+    node_index = dict()
+
+    for geometry in lanes.geometry:
+        if geometry is None or geometry.geom_type not in (
+            "LineString",
+            "MultiLineString",
+        ):
+            continue
+        parts = (
+            geometry.geoms if geometry.geom_type == "MultiLineString" else [geometry]
+        )
+        for part in parts:
+            coords = np.asarray(part.coords)[:, :2]
+            ids = [
+                node_index.setdefault(tuple(np.round(c, 7)), len(node_index))
+                for c in coords
+            ]
+            weights = haversine(
+                coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1]
+            )
+            graph.add_weighted_edges_from(zip(ids[:-1], ids[1:], weights))
+
+    nodes = np.array(list(node_index), dtype=float)
+    return graph, nodes
@@ -0,0 +1,83 @@
+import os
+
+import pandas as pd
+import geopandas as gpd
+
+# Binary formats, geometry stored as WKB with the CRS (GeoParquet / Feather)
+BINARY_FORMATS = [".parquet", ".feather"]
+
+
+def save_frame(data, path, **csv_kwargs):
+    """Saves a (Geo)DataFrame, the format being given by the extension of path.
+
+    .parquet and .feather files store the geometry as WKB together with the CRS,
+    any other extension is written as CSV (geometry as WKT) with csv_kwargs.
+
+    Args:
+        data ([Pandas DataFrame or GeoDataFrame]): Data to save.
+        path ([String]): Output path.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".parquet":
+        data.to_parquet(path, index=False)
+    elif extension == ".feather":
+        data.reset_index(drop=True).to_feather(path)
+    else:
+        csv_kwargs.setdefault("index", False)
+        data.to_csv(path, **csv_kwargs)
+
+
+def load_frame(path, columns=None, crs="EPSG:4326"):
+    """Loads a (Geo)DataFrame saved by save_frame, reading only the requested columns.
+
+    Args:
+        path ([String]): Path of the file.
+        columns ([List], optional): Columns to read. Defaults to all of them.
+        crs ([String], optional): CRS of the geometry of CSV files (binary files store their own).
+
+    Returns:
+        [GeoDataFrame]: Loaded data, a Pandas DataFrame when there is no geometry column.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in BINARY_FORMATS:
+        if extension == ".parquet":
+            geo_read, read = gpd.read_parquet, pd.read_parquet
+        else:
+            geo_read, read = gpd.read_feather, pd.read_feather
+        if columns is None or "geometry" in columns:
+            try:
+                return geo_read(path, columns=columns)
+            except ValueError:
+                # Table saved without geometry
+                pass
+        return read(path, columns=columns)
+
+    data = pd.read_csv(path, usecols=columns)
+    if "geometry" not in data.columns:
+        return data
+
+    # WKT parsed in a single vectorized call
+    wkt = data["geometry"].where(data["geometry"].notna(), None)
+    data["geometry"] = gpd.GeoSeries.from_wkt(wkt).values
+    return gpd.GeoDataFrame(data, geometry="geometry", crs=crs)
+
+
+def read_columns(path):
+    """Returns the names of the columns of a file saved by save_frame, without loading it.
+
+    Args:
+        path ([String]): Path of the file.
+
+    Returns:
+        [List]: Names of the columns.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".parquet":
+        import pyarrow.parquet
+
+        return pyarrow.parquet.ParquetFile(path).schema_arrow.names
+    if extension == ".feather":
+        import pyarrow.ipc
+
+        return pyarrow.ipc.open_file(path).schema.names
+    return list(pd.read_csv(path, nrows=0).columns)
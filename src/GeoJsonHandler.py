@@ -1,87 +1,299 @@
+import hashlib
 import json
-from tqdm import tqdm
+import os
 import pandas as pd
 import numpy as np
 import geopandas as gpd
 from shapely.geometry import *
+from shapely.prepared import prep
+
+# Local packages
+from GeoIO import BINARY_FORMATS, load_frame, save_frame
 
 
 class GeoJsonHandler:
-    def __init__(self, path, name):
+    def __init__(self, path, name, cache_dir=None):
         self.path = path
         self.name = name
-        self.load_json()
+        self.cache_dir = cache_dir
+        self._geodata = None
+
+        if not self.load_cache():
+            self.load_json()
+            # add_centers also builds the GeoDataFrame
+            self.add_centers()
+            self.save_cache()
+
         self.load_names()
-        self.add_centers()
-        self.update_geopandas()
+
+    @property
+    def geodata(self):
+        """[Dict]: GeoJSON FeatureCollection. Rebuilt from the GeoDataFrame on first access after a cached load."""
+        if self._geodata is None:
+            self._geodata = json.loads(self.gdf.to_json())
+        return self._geodata
+
+    @geodata.setter
+    def geodata(self, value):
+        self._geodata = value
 
     def load_json(self):
         # open the json
         with open(self.path) as sectors_file:
             self.geodata = json.load(sectors_file)
+        self.clear_geometry_cache()
 
-    def load_names(self):
-        self.names = []
-        for index in range(len(self.geodata["features"])):
-            self.names.append(
-                self.geodata["features"][index]["properties"][self.name]
-                .strip()
-                .replace("  ", " ")
+    def cache_path(self):
+        """Path of the on-disk cache of this GeoJSON file, keyed by its absolute path.
+
+        The sectors are stored as GeoParquet (geometry as WKB, properties as columns),
+        next to a small JSON file (see meta_path) identifying the source they were read from.
+
+        Returns:
+            [String]: Path of the cache file, None when no cache directory is set.
+        """
+        if self.cache_dir is None:
+            return None
+        key = hashlib.sha1(os.path.abspath(self.path).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key[:16]}.parquet")
+
+    def meta_path(self):
+        """[String]: Path of the source modification time and hash of the cache, None without cache."""
+        cache_path = self.cache_path()
+        if cache_path is None:
+            return None
+        return os.path.splitext(cache_path)[0] + ".json"
+
+    def load_cache(self):
+        """Loads the sectors from the on-disk cache, skipping JSON parsing.
+
+        The cache is valid when the source file has the same modification time,
+        or failing that the same content hash, as when it was written (the new
+        modification time is then stored). An unreadable cache is deleted.
+
+        Returns:
+            [Boolean]: True if the sectors were loaded from a valid cache.
+        """
+        cache_path, meta_path = self.cache_path(), self.meta_path()
+        if cache_path is None or not os.path.exists(meta_path):
+            return False
+
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            mtime = os.path.getmtime(self.path)
+            if meta["mtime"] != mtime:
+                if meta["sha1"] != _file_sha1(self.path):
+                    return False
+                # Same content: store the new modification time to skip hashing next time
+                meta["mtime"] = mtime
+                _write_json(meta, meta_path)
+            cache = load_frame(cache_path)
+        except ImportError as error:
+            # GeoParquet needs the optional pyarrow
+            print(f"Warning: cannot read {cache_path} ({error}).")
+            return False
+        except Exception as error:
+            print(f"Warning: invalid cache {cache_path} ({error!r}), rebuilding it.")
+            for path in [meta_path, cache_path]:
+                if os.path.exists(path):
+                    os.remove(path)
+            return False
+
+        self._geodata = None
+        self.clear_geometry_cache()
+        self._geometries = cache.geometry.reset_index(drop=True)
+        self.update_geopandas(pd.DataFrame(cache.drop(columns="geometry")))
+        return True
+
+    def save_cache(self):
+        """Persists the sectors (GeoParquet, see cache_path) to the cache directory."""
+        cache_path, meta_path = self.cache_path(), self.meta_path()
+        if cache_path is None:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        meta = {
+            "source": os.path.abspath(self.path),
+            "mtime": os.path.getmtime(self.path),
+            "sha1": _file_sha1(self.path),
+        }
+        # The metadata is written last: a cache without it is never read
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        temporary = os.path.splitext(cache_path)[0] + ".tmp.parquet"
+        try:
+            save_frame(self.gdf, temporary)
+        except Exception as error:
+            print(f"Warning: cannot cache {self.path} ({error}).")
+            return
+        os.replace(temporary, cache_path)
+        _write_json(meta, meta_path)
+
+    def clear_geometry_cache(self):
+        """Drops the cached shapely geometries, bounding boxes and spatial index.
+        Has to be called whenever the geometry of geodata is modified.
+        """
+        self._geometries = None
+        self._prepared = None
+        self._bounds = None
+        self._sindex = None
+
+    def __getstate__(self):
+        # Prepared geometries and spatial index cannot be pickled, they are rebuilt lazily
+        state = self.__dict__.copy()
+        state["_prepared"] = None
+        state["_sindex"] = None
+        return state
+
+    @property
+    def geometries(self):
+        """[GeoSeries]: Shapely geometry of each feature (GPS coordinates system), built once."""
+        if self._geometries is None:
+            self._geometries = gpd.GeoSeries(
+                [shape(feature["geometry"]) for feature in self.geodata["features"]],
+                crs="EPSG:4326",
             )
+        return self._geometries
+
+    @property
+    def prepared(self):
+        """[List]: Prepared geometries, for fast repeated predicates on a single sector."""
+        if self._prepared is None:
+            self._prepared = [prep(geometry) for geometry in self.geometries]
+        return self._prepared
 
-    def update_geopandas(self):
-        # Store GeoPandas Format for future
-        self.gdf = gpd.GeoDataFrame.from_features(self.geodata["features"])
-        self.gdf["geometry"] = self.gdf["geometry"].set_crs(epsg=4326)
+    @property
+    def bounds(self):
+        """[Numpy Array]: (minx, miny, maxx, maxy) bounding box of each feature."""
+        if self._bounds is None:
+            self._bounds = self.geometries.bounds.to_numpy()
+        return self._bounds
+
+    @property
+    def sindex(self):
+        """Spatial index over the feature geometries."""
+        if self._sindex is None:
+            self._sindex = self.geometries.sindex
+        return self._sindex
+
+    def load_names(self):
+        self.names = [normalize_name(name) for name in self.gdf[self.name]]
+
+    def update_geopandas(self, properties=None):
+        # Store GeoPandas Format for future (geometries taken from the cache)
+        if properties is None:
+            properties = pd.DataFrame(
+                [feature["properties"] for feature in self.geodata["features"]]
+            )
+        properties = properties.reset_index(drop=True)
+        properties.insert(0, "geometry", self.geometries.values)
+        self.gdf = gpd.GeoDataFrame(properties, geometry="geometry", crs="EPSG:4326")
 
     def add_centers(self):
-        data = gpd.GeoDataFrame.from_features(self.geodata["features"])
-        data["CENTER"] = data["geometry"].centroid
-        data["CENTER_LONG"] = data["geometry"].centroid.x
-        data["CENTER_LAT"] = data["geometry"].centroid.y
-        # self.add_property(data, "CENTER", verbose=False)
-        self.add_property(data, "CENTER_LONG", verbose=False)
-        self.add_property(data, "CENTER_LAT", verbose=False)
+        # By position: geometries are aligned with the features, even if names are duplicated
+        for feature, geometry in zip(self.geodata["features"], self.geometries):
+            center = geometry.centroid
+            feature["properties"]["CENTER_LONG"] = center.x
+            feature["properties"]["CENTER_LAT"] = center.y
+        self.update_geopandas()
 
     def add_property(self, data, value, norm_by_area=False, verbose=True):
-        """[summary] 
+        """Adds one column of a DataFrame as a property of each feature (see add_properties).
 
         Args:
-            data ([type]): [description]
-            value ([type]): [description]
+            data ([Pandas DataFrame]): DataFrame containing the key column (self.name) and the value column.
+            value ([String]): Name of the column to add.
+            norm_by_area ([Boolean], optional): Divide the value by the AREA property. Defaults to False.
         """
+        self.add_properties(data, [value], norm_by_area=norm_by_area, verbose=verbose)
+
+    def add_properties(self, data, values, norm_by_area=False, verbose=True):
+        """Adds several columns of a DataFrame as properties of each feature, in a single pass.
+
+        The DataFrame is indexed once on the key column and the GeoDataFrame is rebuilt once.
+        Features without a matching row get the value 0.
+
+        Args:
+            data ([Pandas DataFrame]): DataFrame containing the key column (self.name) and the value columns.
+            values ([List]): Names of the columns to add.
+            norm_by_area ([Boolean], optional): Divide the values by the AREA property. Defaults to False.
+        """
+        # Hash index on the key column, first row kept for duplicated keys
+        lookup = (
+            data.drop_duplicates(subset=self.name)
+            .set_index(self.name)[values]
+            .to_dict("index")
+        )
 
         # For each feature (each shape)
-        for index in range(len(self.geodata["features"])):
-            # Extract correct element of GeoJSON
-            temp_ = self.geodata["features"][index]["properties"]
-
-            # Extract the property from dataframe
-            val = data[data[self.name] == temp_[self.name]][value]
-
-            if val.empty:
-                val = 0
-            else:
-                if norm_by_area:
-                    area_ = self.geodata["features"][index]["properties"]["AREA"]
-                    val = val.item() / area_
+        for feature in self.geodata["features"]:
+            properties = feature["properties"]
+            row = lookup.get(properties[self.name])
+
+            for value in values:
+                if row is None:
+                    val = 0
+                elif norm_by_area:
+                    val = row[value] / properties["AREA"]
                 else:
-                    val = val.item()
+                    val = row[value]
 
-            # Store results
-            temp_[value] = val
-            self.geodata["features"][index]["properties"] = temp_
+                # Store results
+                properties[value] = val
 
         self.update_geopandas()
 
         if verbose:
-            print(f"Successfully added {value} property to geodata.")
+            label = "property" if len(values) == 1 else "properties"
+            print(f"Successfully added {', '.join(values)} {label} to geodata.")
 
     def save_json(self, output_path):
+        """Saves the geodata. Paths ending in .parquet or .feather are saved in binary format
+        (GeoParquet / Feather, geometry as WKB), any other path as GeoJSON.
+        """
+        if os.path.splitext(output_path)[1].lower() in BINARY_FORMATS:
+            save_frame(self.gdf, output_path)
+            print(f"Successfully saved {output_path}.")
+            return
+
         with open(output_path, "w",) as f:
             json.dump(self.geodata, f)
         print(f"Successfully saved geojson.")
 
+    def locate(self, geometries):
+        """Finds, for each geometry, the sector it intersects.
+
+        The sector polygons are indexed once with a spatial index and all the
+        geometries are matched in a single bulk query. When a geometry intersects
+        several sectors, the first one (in GeoJSON order) is kept.
+
+        Args:
+            geometries ([GeoSeries]): Geometries to locate (GPS coordinates system).
+
+        Returns:
+            [Numpy Array]: Position of the matching sector in geodata["features"]
+            for each geometry, -1 when no sector intersects it.
+        """
+        pairs = query_bulk(self.sindex, geometries, predicate="intersects")
+        return first_match(pairs, len(geometries))
+
+    def find_sector(self, long, lat):
+        """Returns the name of the sector containing a single GPS point.
+
+        Args:
+            long ([float]): Longitude of the point.
+            lat ([float]): Latitude of the point.
+
+        Returns:
+            [String]: Name of the sector, None if the point is outside all sectors.
+        """
+        point = Point(long, lat)
+        for index in sorted(self.sindex.intersection(point.bounds)):
+            if self.prepared[index].intersects(point):
+                return self.geodata["features"][index]["properties"][self.name]
+        return None
+
     def assign_data_to_neighborhood(self, data, output_path, muni=False, verbose=False):
         """This function assigns the points of some external data to each sector of the geodata.
 
@@ -91,71 +303,90 @@ class GeoJsonHandler:
                     - column2: other property to keep 
                     - column3: longitude name as 'Long'
                     - column4: latitude name as 'Lat'
-                output_path ([String]): outpath path to save results in a CSV file.
-                muni ([Boolean]): Indicating whether we are using a municipalities geojson
+                output_path ([String]): outpath path to save results in a CSV file (or .parquet / .feather file).
+                muni ([Boolean]): Indicating whether we are using a municipalities geojson.
+                    Kept for backward compatibility, the coordinates dimension is now inferred.
 
             Returns:
                 [Pandas DataFrame]: Results
             """
 
         colnames = list(data.columns)
-        points = []
-        saves = pd.DataFrame(columns=[self.name] + colnames)
-
-        for i in tqdm(range(len(data))):  # all points
-            row = data.iloc[i]
-            Long, Lat = float(row["Long"]), float(row["Lat"])
-            points.append(Point(Long, Lat))
-            p = gpd.GeoSeries(Point(float(row["Long"]), float(row["Lat"])))
-
-            for n in range(len(self.names)):  # all sectors
-
-                neighborhood = self.geodata["features"][n]["properties"][self.name]
-
-                if verbose:
-                    print(neighborhood)
-
-                nbr_polygons = len(
-                    self.geodata["features"][n]["geometry"]["coordinates"]
-                )
-
-                for k in range(nbr_polygons):
-
-                    if muni:
-                        poly_coords = Polygon(
-                            np.array(
-                                self.geodata["features"][n]["geometry"]["coordinates"][
-                                    k
-                                ]
-                            ).reshape(-1, 2)
-                        )
-                    else:
-                        poly_coords = Polygon(
-                            np.array(
-                                self.geodata["features"][n]["geometry"]["coordinates"][
-                                    k
-                                ]
-                            ).reshape(-1, 3)
-                        )
-
-                    poly = gpd.GeoSeries([poly_coords])
-
-                    res = p.intersects(poly)
-
-                    if res[0]:
-                        saves.loc[len(saves)] = [
-                            neighborhood,
-                            row[colnames[0]],
-                            row[colnames[1]],
-                            Long,
-                            Lat,
-                        ]
-                        # Found a neighborhood for this point, thus exit the loop
-                        break
-                if res[0]:
-                    break  # Already found a match
-
-        saves.to_csv(output_path, index=False)
-        print(f"\n Successfully saved CSV file. \n")
+        longs = data["Long"].astype(float).to_numpy()
+        lats = data["Lat"].astype(float).to_numpy()
+        points = gpd.GeoSeries(gpd.points_from_xy(longs, lats), crs="EPSG:4326")
+
+        # Single vectorized query of all the points against the sectors
+        matches = self.locate(points)
+        found = matches >= 0
+
+        saves = data.loc[found, colnames].reset_index(drop=True)
+        saves["Long"] = longs[found]
+        saves["Lat"] = lats[found]
+        saves.insert(0, self.name, self.gdf[self.name].to_numpy()[matches[found]])
+
+        if verbose:
+            print(f"{found.sum()} / {len(data)} points assigned to a neighborhood.")
+
+        save_frame(saves, output_path)
+        print(f"\n Successfully saved {output_path}. \n")
         return saves
 
+
+def _file_sha1(path):
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def normalize_name(name):
+    """Name of a sector as listed in GeoJsonHandler.names (stripped, single spaces).
+    Other modules normalize their labels with it before matching them with the sectors.
+    """
+    if not isinstance(name, str):
+        return name
+    return name.strip().replace("  ", " ")
+
+
+def _write_json(data, path):
+    # Write to a temporary file first so that a crash never leaves a corrupted file
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)
+
+
+def query_bulk(sindex, geometries, predicate=None):
+    """Queries a spatial index with several geometries at once.
+
+    geopandas < 0.12 exposes the bulk query as query_bulk, later versions as query.
+
+    Returns:
+        [Numpy Array]: (2, k) array of (input position, tree position) pairs.
+    """
+    if hasattr(sindex, "query_bulk"):
+        return sindex.query_bulk(geometries, predicate=predicate)
+    return sindex.query(geometries, predicate=predicate)
+
+
+def first_match(pairs, n, priority=None):
+    """Keeps one tree position per input: the lowest priority, then the lowest tree position.
+
+    Args:
+        pairs ([Numpy Array]): (2, k) array of (input position, tree position) pairs (see query_bulk).
+        n ([int]): Number of inputs.
+        priority ([Numpy Array], optional): Priority of each pair, lowest first. Defaults to None.
+
+    Returns:
+        [Numpy Array]: Tree position for each input, -1 for inputs without pair.
+    """
+    result = np.full(n, -1, dtype=int)
+    if priority is None:
+        order = np.lexsort((pairs[1], pairs[0]))
+    else:
+        order = np.lexsort((pairs[1], priority, pairs[0]))
+    inputs, tree = pairs[0][order], pairs[1][order]
+    _, first = np.unique(inputs, return_index=True)
+    result[inputs[first]] = tree[first]
+    return result
@@ -0,0 +1,178 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+# Local packages
+from DemandEstimator import (
+    ENERGY_PER_KM,
+    TRIP_TYPES,
+    DemandEstimator,
+    align_matrix,
+    sector_positions,
+)
+from GeoJsonHandler import normalize_name
+
+HOURS = 24
+
+
+class HourlyTrips:
+    """Hourly trips stored as origin x destination x hour arrays, memory-mapped from disk.
+
+    One .npy file per trip type (regular, irregular) is kept in a directory with the names of
+    the sectors, so that the trips are never loaded as a long DataFrame: the arrays are
+    read block of origins by block of origins.
+    """
+
+    def __init__(self, directory, mode="r"):
+        """Opens hourly trips previously written by generate or from_csv.
+
+        Args:
+            directory ([String]): Directory of the arrays.
+            mode (str, optional): Memory-map mode ("r" or "r+"). Defaults to "r".
+        """
+        self.directory = directory
+        with open(os.path.join(directory, "names.json"), encoding="utf-8") as f:
+            self.names = json.load(f)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.trips = {
+            trip_type: np.load(_array_path(directory, trip_type), mmap_mode=mode)
+            for trip_type in TRIP_TYPES
+        }
+
+    @classmethod
+    def create(cls, directory, names, dtype=np.float64):
+        """Creates empty (zero) arrays for the given sectors and opens them for writing.
+
+        Trips are floating point by default: sampled or scaled trip counts are not integers.
+        The names are normalized with normalize_name, as GeoJsonHandler.names.
+        """
+        names = [normalize_name(name) for name in names]
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "names.json"), "w", encoding="utf-8") as f:
+            json.dump(list(names), f)
+        shape = (len(names), len(names), HOURS)
+        for trip_type in TRIP_TYPES:
+            np.lib.format.open_memmap(
+                _array_path(directory, trip_type), mode="w+", dtype=dtype, shape=shape
+            )
+        return cls(directory, mode="r+")
+
+    @classmethod
+    def generate(
+        cls, directory, names, low=0, high=10000, seed=None, block=16, dtype=np.float64,
+    ):
+        """Generates random hourly trips (uniform integers in [low, high[), as the random
+        dataset notebook did, written block of origins by block of origins.
+
+        Args:
+            directory ([String]): Directory of the arrays.
+            names ([List]): Names of the sectors.
+            seed ([Int], optional): Seed of the generator. Defaults to None.
+            block (int, optional): Number of origins generated at once. Defaults to 16.
+            dtype ([dtype], optional): Type of the arrays. Defaults to np.float64.
+        """
+        hourly = cls.create(directory, names, dtype=dtype)
+        rng = np.random.default_rng(seed)
+        for trips in hourly.trips.values():
+            for start in range(0, len(names), block):
+                stop = min(start + block, len(names))
+                trips[start:stop] = rng.integers(
+                    low, high, size=(stop - start,) + trips.shape[1:]
+                )
+            trips.flush()
+        return hourly
+
+    @classmethod
+    def from_csv(
+        cls,
+        path,
+        directory,
+        names=None,
+        columns=("regularTripSample", "irregularTripSample"),
+        chunksize=100000,
+        dtype=np.float64,
+    ):
+        """Converts a long hourly CSV (originNB, destinationNB, arrival_hr, trips) into arrays,
+        reading it chunk by chunk.
+
+        Args:
+            path ([String]): Path of the CSV.
+            directory ([String]): Directory of the arrays.
+            names ([List], optional): Names of the sectors. Defaults to the origins of the CSV,
+                in the order of the file.
+            columns (tuple, optional): Columns of the trips, in the order of TRIP_TYPES.
+            chunksize (int, optional): Number of rows read at once. Defaults to 100000.
+            dtype ([dtype], optional): Type of the arrays. Defaults to np.float64.
+
+        Raises:
+            ValueError: If origins or destinations are not in names.
+        """
+        if names is None:
+            origins = pd.read_csv(path, usecols=["originNB"])["originNB"]
+            names = list(origins.map(normalize_name).unique())
+        hourly = cls.create(directory, names, dtype=dtype)
+
+        for chunk in tqdm(pd.read_csv(path, chunksize=chunksize)):
+            position = (
+                sector_positions(chunk["originNB"], hourly.index),
+                sector_positions(chunk["destinationNB"], hourly.index),
+                chunk["arrival_hr"].to_numpy(dtype=int),
+            )
+            for trip_type, column in zip(TRIP_TYPES, columns):
+                hourly.trips[trip_type][position] = chunk[column].to_numpy()
+
+        for trips in hourly.trips.values():
+            trips.flush()
+        return hourly
+
+    def energy_demand(self, distances, energy_per_km=ENERGY_PER_KM, block=16):
+        """Computes the energy demand of each destination sector for each hour of arrival.
+
+        The distances are aligned on self.names by label, whatever the order of the sectors.
+
+        Args:
+            distances ([DataFrame or DemandEstimator]): Origin x destination distances (km), indexed
+                by origin with one column per destination, or an estimator with loaded distances.
+            energy_per_km ([Float], optional): Consumption of a vehicle in kWh/km. Defaults to ENERGY_PER_KM.
+            block (int, optional): Number of origins read at once. Defaults to 16.
+
+        Returns:
+            [Dict]: Trip type (regular, irregular, total) -> DataFrame indexed by sector, one column per hour.
+
+        Raises:
+            ValueError: If sectors of self.names are missing from the distances.
+        """
+        if isinstance(distances, DemandEstimator):
+            distances = pd.DataFrame(
+                distances.distances, index=distances.keys, columns=distances.keys
+            )
+        if not isinstance(distances, pd.DataFrame):
+            raise TypeError(
+                "distances must be labeled by sector (DataFrame or DemandEstimator)"
+            )
+        distances = align_matrix(distances, self.names)
+
+        demand = dict()
+        for trip_type, trips in self.trips.items():
+            energy = np.zeros((len(self.names), HOURS))
+            for start in range(0, len(self.names), block):
+                stop = start + block
+                energy += np.einsum(
+                    "odh,od->dh", trips[start:stop], distances[start:stop]
+                )
+            demand[trip_type] = energy * energy_per_km
+        demand["total"] = sum(demand[trip_type] for trip_type in TRIP_TYPES)
+
+        return {
+            trip_type: pd.DataFrame(
+                energy, index=pd.Index(self.names), columns=range(HOURS)
+            )
+            for trip_type, energy in demand.items()
+        }
+
+
+def _array_path(directory, trip_type):
+    return os.path.join(directory, f"{trip_type}.npy")
@@ -1,121 +1,166 @@
 import json
+import re
 import geopandas as gpd
 import pandas as pd
-from tqdm import tqdm
 from shapely.geometry import *
 import numpy as np
 
-# Used to measure the length of lines
-from shapely.geometry import LineString
-from shapely.ops import transform
-from functools import partial
-import pyproj
 
 # Local packages
-from GeoJsonHandler import GeoJsonHandler
+from GeoJsonHandler import GeoJsonHandler, first_match, query_bulk
+from GeoIO import load_frame, save_frame
+
+
+# Schema of each feature type of the Overpass-turbo exports:
+#   - id: property holding the OSM id ("node/123"), split into TYPE and ID
+#   - columns: properties kept, with their new name (NAME is always expected)
+#   - drop_lines: drop the LineString elements
+#   - dedup: keep one row per ID, the ways/relations before the nodes
+#   - length: compute the length of the elements (in meters)
+# Adding a layer only requires adding its schema here.
+FEATURE_SCHEMAS = {
+    "university": {
+        "id": "id",
+        "columns": {"name": "NAME", "amenity": "AMENITY"},
+        "dedup": True,
+    },
+    "health": {
+        "id": "id",
+        "columns": {"name": "NAME", "amenity": "AMENITY"},
+        "dedup": True,
+    },
+    "residential": {
+        "id": "@id",
+        "columns": {"name": "NAME", "landuse": "LANDUSE"},
+        "drop_lines": True,
+        "dedup": True,
+    },
+    "sport": {"id": "id", "columns": {"name": "NAME"}, "drop_lines": True},
+    "sustenance": {"id": "id", "columns": {"name": "NAME", "amenity": "AMENITY"}},
+    "culture": {"id": "id", "columns": {"name": "NAME", "amenity": "AMENITY"}},
+    "shop": {"id": "id", "columns": {"name": "NAME"}},
+    "office": {"id": "id", "columns": {"name": "NAME"}},
+    "tourism": {"id": "id", "columns": {"name": "NAME"}},
+    "lanes": {"id": "@id", "columns": {"name": "NAME"}, "length": True},
+    "parking": {"id": "@id", "columns": {"name": "NAME"}},
+}
 
 
 class OSMGeoJsonHandler:
-    def __init__(self, path, feature_type):
+    # Belgian Lambert 72, metric projection covering Brussels, used for lengths and areas
+    projected_crs = "EPSG:31370"
+
+    def __init__(self, path, feature_type, chunksize=None):
+        """
+        Args:
+            path ([String]): Path of the Overpass-turbo GeoJSON export.
+            feature_type ([String]): Type of the features (health, lanes, parking, ...).
+            chunksize ([int], optional): If given, the file is streamed by chunks of features
+                instead of being loaded at once, and geodata is not kept. Defaults to None.
+        """
         self.path = path
         self.feature_type = feature_type
+        self.chunksize = chunksize
+        self._projected = None
         self.load_json()
         self.create_geodataframe()
 
     def load_json(self):
+        if self.chunksize is not None:
+            # Streamed in create_geodataframe
+            self.geodata = None
+            return
+
         # open the json
         with open(self.path, encoding="utf-8") as fh:
             self.geodata = json.load(fh)
 
     def create_geodataframe(self):
 
-        self.gdf = gpd.GeoDataFrame.from_features(self.geodata["features"])
-
-        if self.feature_type in ["university", "health"]:
-            self.gdf.rename(
-                columns={"id": "ID", "name": "NAME", "amenity": "AMENITY"},
-                inplace=True,
-            )
-            self.gdf[["TYPE", "ID"]] = self.gdf["ID"].str.split("/", expand=True)
-            self.gdf = self.gdf[["ID", "TYPE", "NAME", "AMENITY", "geometry"]]
-
-            self.gdf.sort_values(by="TYPE", ascending=False)
-            self.gdf.drop_duplicates(subset="ID", keep="first", inplace=True)
+        if self.chunksize is None:
+            self.gdf = self.format_features(self.geodata["features"])
+        else:
+            # The schema of the feature type is applied chunk by chunk while streaming the file
+            chunks = [
+                self.format_features(features)
+                for features in _iter_features(self.path, self.chunksize)
+            ]
+            self.gdf = pd.concat(chunks, ignore_index=True)
+        self._projected = None
 
-        elif self.feature_type == "residential":
-            self.gdf.rename(
-                columns={"@id": "ID", "name": "NAME", "landuse": "LANDUSE"},
-                inplace=True,
-            )
-            self.gdf[["TYPE", "ID"]] = self.gdf["ID"].str.split("/", expand=True)
-            self.gdf = self.gdf[["ID", "TYPE", "NAME", "LANDUSE", "geometry"]]
-
-            # Drop LineString elements
-            self.gdf = self.gdf.drop(
-                self.gdf[self.gdf["geometry"].type == "LineString"].index
-            )
+        schema = FEATURE_SCHEMAS.get(self.feature_type, {})
 
+        if schema.get("dedup"):
             # For the relations, we have separate lines for Points and Polygons
             # We sort the dataframes to make sure that all the "points" are at the bottom because the drop_duplicates
-            # will only keep the first elements.
-            self.gdf.sort_values(by="TYPE", ascending=False)
-            self.gdf.drop_duplicates(subset="ID", keep="first", inplace=True)
-
-        elif self.feature_type == "sport":
-            self.gdf.rename(
-                columns={"id": "ID", "name": "NAME",}, inplace=True,
+            # will only keep the first elements. The original order of the rows is kept.
+            kept = (
+                self.gdf.sort_values(by="TYPE", ascending=False, kind="stable")
+                .drop_duplicates(subset="ID", keep="first")
+                .index
             )
-            self.gdf[["TYPE", "ID"]] = self.gdf["ID"].str.split("/", expand=True)
-            self.gdf = self.gdf[["ID", "TYPE", "NAME", "geometry"]]
+            self.gdf = self.gdf[self.gdf.index.isin(kept)]
 
-            # Drop LineString elements
-            self.gdf = self.gdf.drop(
-                self.gdf[self.gdf["geometry"].type == "LineString"].index
-            )
+        # Convert back to GeoDataFrame
+        self.gdf = gpd.GeoDataFrame(self.gdf)
+        if schema.get("length"):
+            self.compute_length()
+        self.compute_area()
+        self.get_center()
 
-        elif self.feature_type in ["sustenance", "health", "culture"]:
-            self.gdf.rename(
-                columns={"id": "ID", "name": "NAME", "amenity": "AMENITY"},
-                inplace=True,
-            )
-            self.gdf[["TYPE", "ID"]] = self.gdf["ID"].str.split("/", expand=True)
-            self.gdf = self.gdf[["ID", "TYPE", "NAME", "AMENITY", "geometry"]]
+    def format_features(self, features):
+        """Builds the GeoDataFrame of a list of GeoJSON features, according to the schema of the feature type.
 
-        elif self.feature_type in ["shop", "office", "tourism", "residential"]:
-            self.gdf.rename(
-                columns={"id": "ID", "name": "NAME",}, inplace=True,
-            )
-            self.gdf[["TYPE", "ID"]] = self.gdf["ID"].str.split("/", expand=True)
-            self.gdf = self.gdf[["ID", "TYPE", "NAME", "geometry"]]
+        Only the properties listed in the schema are read, LineStrings are filtered out while reading
+        when the schema asks for it, and the OSM id is split once into TYPE and ID.
+        Feature types without schema are loaded with all their properties.
 
-        elif self.feature_type in ["lanes"]:
-            self.gdf.rename(
-                columns={"@id": "ID", "name": "NAME",}, inplace=True,
-            )
-            self.gdf[["TYPE", "ID"]] = self.gdf["ID"].str.split("/", expand=True)
-            self.gdf = self.gdf[["ID", "TYPE", "NAME", "geometry"]]
-            self.compute_length()
+        Args:
+            features ([List]): GeoJSON features.
+
+        Returns:
+            [GeoDataFrame]: Formatted features (EPSG:4326, as the sectors).
+        """
+        schema = FEATURE_SCHEMAS.get(self.feature_type)
+        if schema is None:
+            return gpd.GeoDataFrame.from_features(features, crs="EPSG:4326")
 
-        elif self.feature_type in ["parking"]:
-            self.gdf.rename(
-                columns={"@id": "ID", "name": "NAME",}, inplace=True,
+        if schema.get("drop_lines"):
+            # Drop LineString elements
+            features = [
+                feature
+                for feature in features
+                if (feature["geometry"] or {}).get("type") != "LineString"
+            ]
+
+        missing = [
+            i
+            for i, feature in enumerate(features)
+            if schema["id"] not in feature["properties"]
+        ]
+        if missing:
+            raise ValueError(
+                f"{len(missing)} features of {self.path} have no '{schema['id']}' property, "
+                f"required as id by the '{self.feature_type}' schema (first at position {missing[0]})."
             )
-            self.gdf[["TYPE", "ID"]] = self.gdf["ID"].str.split("/", expand=True)
-            self.gdf = self.gdf[["ID", "TYPE", "NAME", "geometry"]]
+        ids = pd.Series(
+            [feature["properties"][schema["id"]] for feature in features], dtype=object,
+        )
+        split = ids.str.split("/", n=1, expand=True).reindex(columns=[0, 1])
 
-        # Convert back to GeoDataFrame
-        self.gdf = gpd.GeoDataFrame(self.gdf)
-        self.compute_area()
-        self.get_center()
+        data = {"ID": split[1].to_numpy(), "TYPE": split[0].to_numpy()}
+        for key, column in schema["columns"].items():
+            data[column] = [feature["properties"].get(key) for feature in features]
+        geometry = [
+            shape(feature["geometry"]) if feature["geometry"] else None
+            for feature in features
+        ]
+        return gpd.GeoDataFrame(data, geometry=geometry, crs="EPSG:4326")
 
     def compute_area(self):
         # Explanation aobut why should we use this CRS projection to comute the area?
         # Available here: https://gis.stackexchange.com/questions/218450/getting-polygon-areas-using-geopandas
-        gdf = gpd.GeoDataFrame(self.gdf)
-        gdf["geometry"] = gdf["geometry"].set_crs(epsg=4326)
-        temp_ = gdf["geometry"].to_crs("epsg:32633")
-
-        self.gdf["AREA"] = temp_.area / 1e6
+        self.gdf["AREA"] = self.projected_geometry().area.to_numpy() / 1e6
 
         if self.feature_type in [
             "university",
@@ -125,8 +170,8 @@ class OSMGeoJsonHandler:
             "tourism",
         ]:
             # Fill null areas with the median (not the average as there are too many extreme values)
-            self.gdf["AREA"].replace(
-                0, self.gdf[self.gdf["AREA"] != 0]["AREA"].median(), inplace=True
+            self.gdf["AREA"] = self.gdf["AREA"].replace(
+                0, self.gdf[self.gdf["AREA"] != 0]["AREA"].median()
             )
 
         elif self.feature_type == "residential":
@@ -139,60 +184,170 @@ class OSMGeoJsonHandler:
             #    0, self.gdf[self.gdf["AREA"] != 0]["AREA"].mean(), inplace=True
             #)
 
+    def save(self, output_path):
+        """Saves the GeoDataFrame. Paths ending in .parquet or .feather keep the geometry as WKB
+        and the CRS, other paths are written as CSV (geometry as WKT).
+
+        Args:
+            output_path ([String]): Output path.
+        """
+        save_frame(
+            self.gdf, output_path, sep=",", encoding="utf-8-sig", chunksize=10000
+        )
+
+    @staticmethod
+    def load(path, columns=None):
+        """Loads a layer saved by save, reading only the requested columns.
+
+        Args:
+            path ([String]): Path of the file.
+            columns ([List], optional): Columns to read. Defaults to all of them.
+
+        Returns:
+            [GeoDataFrame]: Layer (Pandas DataFrame when the geometry is not requested).
+        """
+        return load_frame(path, columns=columns)
+
     def get_center(self):
-        self.gdf["LAT"] = self.gdf.centroid.y
-        self.gdf["LON"] = self.gdf.centroid.x
+        # Centroids computed in the metric projection, then brought back to GPS coordinates
+        centers = self.projected_geometry().centroid.to_crs(epsg=4326)
+        self.gdf["LAT"] = centers.y.to_numpy()
+        self.gdf["LON"] = centers.x.to_numpy()
 
-    def assign_ngh(self, ngh: GeoJsonHandler, verbose=False):
+    def assign_ngh(self, ngh: GeoJsonHandler, mode="centroid", verbose=False):
         """This function adds a 'NEIGH' column to a OSMGeoJsonHandler object. This new column gives the neighborhood in which the object belong.
 
+        All the objects are matched against the spatial index of the sectors in a single bulk query.
+
         Args:
             ngh (GeoJsonHandler): OSMGeoJsonHandler - detailing the simits of each sector. (see GeoJsonHanlder documentation)
-            verbose (bool, optional): [description]. Defaults to False.
+            mode (str, optional): "centroid" assigns each object to the sector containing its centroid (LAT/LON).
+                "overlap" assigns lines and polygons to the sector sharing the largest length/area with them,
+                points (and objects without overlap) still use their centroid. Defaults to "centroid".
+            verbose (bool, optional): Print the number of objects left without neighborhood. Defaults to False.
         """
-        points = []
+        if mode not in ["centroid", "overlap"]:
+            raise ValueError(f"Unknown assignment mode: {mode}")
 
-        self.gdf["NAME_FRE"] = ""
-
-        for i in tqdm(range(len(self.gdf))):  # all points
-            row = self.gdf.iloc[i]
-            lon, lat = float(row["LON"]), float(row["LAT"])
-            points.append(Point(lon, lat))
-            p = gpd.GeoSeries(Point(float(row["LON"]), float(row["LAT"])))
+        points = gpd.GeoSeries(
+            gpd.points_from_xy(self.gdf["LON"], self.gdf["LAT"]), crs="EPSG:4326"
+        )
+        matches = ngh.locate(points)
 
-            for n in range(len(ngh.names)):  # all sectors
+        if mode == "overlap":
+            overlap = self.largest_overlap(ngh)
+            matches = np.where(overlap >= 0, overlap, matches)
 
-                neighborhood = ngh.geodata["features"][n]["properties"][ngh.name]
+        names = ngh.gdf[ngh.name].to_numpy()
+        self.gdf["NAME_FRE"] = np.where(matches >= 0, names[matches], "")
 
-                nbr_polygons = len(
-                    ngh.geodata["features"][n]["geometry"]["coordinates"]
-                )
+        if verbose:
+            print(f"{(matches < 0).sum()} objects without neighborhood.")
 
-                for k in range(nbr_polygons):
+    def largest_overlap(self, ngh: GeoJsonHandler):
+        """Finds, for each object, the sector sharing the largest area (polygons) or length (lines) with it.
 
-                    poly_coords = Polygon(
-                        np.array(
-                            ngh.geodata["features"][n]["geometry"]["coordinates"][k]
-                        ).reshape(-1, 3)
-                    )
+        Args:
+            ngh (GeoJsonHandler): Sectors to compare with.
 
-                    poly = gpd.GeoSeries([poly_coords])
+        Returns:
+            [Numpy Array]: Position of the sector in ngh.gdf for each object, -1 for points
+            and objects not overlapping any sector.
+        """
+        geoms = self.gdf["geometry"].reset_index(drop=True)
+        pairs = query_bulk(ngh.sindex, geoms, predicate="intersects")
 
-                    res = p.intersects(poly)
+        # Candidate pairs only, intersections computed array-wise in the metric projection
+        projected = self.projected_geometry().reset_index(drop=True)
+        sectors = ngh.geometries.to_crs(self.projected_crs)
+        left = projected.iloc[pairs[0]].reset_index(drop=True)
+        right = sectors.iloc[pairs[1]].reset_index(drop=True)
+        shared = left.intersection(right)
+        is_polygon = left.geom_type.str.contains("Polygon").to_numpy()
+        size = np.where(is_polygon, shared.area, shared.length)
 
-                    if res[0]:
-                        self.gdf["NAME_FRE"].iloc[i] = neighborhood
-                        break
-                if res[0]:
-                    break  # Already found a match
+        keep = size > 0
+        return first_match(pairs[:, keep], len(geoms), priority=-size[keep])
 
     def compute_length(self):
+        # Length in meters, all geometries at once
+        self.gdf["length"] = self.projected_geometry().length.to_numpy()
 
-        # Geometry transform function based on pyproj.transform
-        project = partial(
-            pyproj.transform, pyproj.Proj("EPSG:4326"), pyproj.Proj("EPSG:32633")
-        )
-        self.gdf["length"] = self.gdf["geometry"].progress_apply(
-            lambda line: transform(project, line).length
-        )
+    def projected_geometry(self):
+        """Returns the geometries projected to the metric projected_crs.
 
+        All the coordinates are transformed in a single call and the result is cached:
+        it is reused as long as the rows of gdf are a subset of the projected ones and
+        hold the very same geometry objects (replaced geometries are projected again).
+
+        Returns:
+            [GeoSeries]: Projected geometries, aligned with gdf.
+        """
+        source = np.asarray(self.gdf["geometry"].values, dtype=object)
+        if self._projected is not None:
+            cached_source, projected = self._projected
+            if self.gdf.index.isin(projected.index).all() and _same_objects(
+                source, cached_source.loc[self.gdf.index]
+            ):
+                return projected.loc[self.gdf.index]
+
+        self._projected = (
+            pd.Series(source, index=self.gdf.index),
+            self.gdf.geometry.to_crs(self.projected_crs),
+        )
+        return self._projected[1]
+
+
+def _same_objects(left, right):
+    # Element-wise identity, cheaper than comparing the geometries
+    return len(left) == len(right) and all(a is b for a, b in zip(left, right))
+
+
+def _iter_features(path, chunksize, buffer_size=1 << 20):
+    """Yields the features of a GeoJSON FeatureCollection by lists of chunksize,
+    reading the file incrementally instead of parsing it as a whole.
+    """
+    decoder = json.JSONDecoder()
+    separators = re.compile(r"[\s,]*")
+
+    with open(path, encoding="utf-8") as fh:
+        # Move to the opening bracket of the features array
+        buffer = ""
+        while True:
+            data = fh.read(buffer_size)
+            if not data:
+                raise ValueError(f"No features array found in {path}")
+            buffer += data
+            key = buffer.find('"features"')
+            bracket = buffer.find("[", key) if key >= 0 else -1
+            if bracket >= 0:
+                buffer, position = buffer[bracket + 1 :], 0
+                break
+
+        chunk = []
+        read_size = buffer_size
+        while True:
+            position = separators.match(buffer, position).end()
+            if buffer.startswith("]", position):
+                break
+            try:
+                feature, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Feature cut by the end of the buffer: read more. The read size doubles while
+                # the same feature keeps failing, so a feature larger than the buffer is only
+                # decoded again a logarithmic number of times.
+                data = fh.read(read_size)
+                if not data:
+                    raise
+                buffer, position = buffer[position:] + data, 0
+                read_size *= 2
+                continue
+
+            read_size = buffer_size
+            chunk.append(feature)
+            if len(chunk) == chunksize:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
@@ -0,0 +1,115 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+# Local packages
+from GeoJsonHandler import GeoJsonHandler
+from OSMGeoJsonHandler import OSMGeoJsonHandler
+
+
+# Output name: (Overpass-turbo export, feature type)
+LAYERS = {
+    "health": ("health.geojson", "health"),
+    "culture": ("culture.geojson", "culture"),
+    "school_university": ("school_university.geojson", "university"),
+    "shop": ("shops.geojson", "shop"),
+    "sustenance": ("sustenance.geojson", "sustenance"),
+    "tourism": ("tourism.geojson", "tourism"),
+    "office": ("office.geojson", "office"),
+    "parking": ("parkings.geojson", "parking"),
+    "sport": ("sport.geojson", "sport"),
+    # The residential buildings export is keyed on "id" (not "@id" as the landuse schema):
+    # loaded with the name-only schema, as in the OSM_Residential notebook
+    "residential": ("residential.geojson", "tourism"),
+    "high-speed-lanes": ("prim-sec-ter-highways.geojson", "lanes"),
+    "residential-lanes": ("residential-lanes.geojson", "lanes"),
+}
+
+# Sectors of the worker process, sent once when the process starts
+_sectors = None
+
+
+def _init_worker(sectors):
+    global _sectors
+    _sectors = sectors
+
+
+def _process_layer(name, input_path, feature_type, output_path, mode, chunksize):
+    start = time.perf_counter()
+    layer = OSMGeoJsonHandler(input_path, feature_type, chunksize=chunksize)
+    layer.assign_ngh(_sectors, mode=mode)
+    layer.save(output_path)
+    return name, len(layer.gdf), time.perf_counter() - start
+
+
+def run_pipeline(
+    input_dir,
+    output_dir,
+    sectors,
+    layers=None,
+    processes=None,
+    mode="centroid",
+    chunksize=None,
+    output_format="csv",
+):
+    """Ingests several OSM layers in parallel processes: loading, neighborhood assignment and saving.
+
+    Args:
+        input_dir ([String]): Directory of the Overpass-turbo exports.
+        output_dir ([String]): Directory where one file per layer is written.
+        sectors ([GeoJsonHandler or String]): Sectors (or path of the sectors GeoJSON), loaded once
+            and shared by all the layers.
+        layers ([List], optional): Names of the layers to process (keys of LAYERS). Defaults to all of them.
+        processes ([int], optional): Number of processes. Defaults to the number of CPUs.
+        mode ([String], optional): Assignment mode of OSMGeoJsonHandler.assign_ngh. Defaults to "centroid".
+        chunksize ([int], optional): Stream the exports by chunks of features (see OSMGeoJsonHandler).
+        output_format ([String], optional): "csv", "parquet" or "feather". Defaults to "csv".
+
+    Returns:
+        [Pandas DataFrame]: Number of rows and processing time (seconds) of each layer.
+    """
+    if isinstance(sectors, str):
+        sectors = GeoJsonHandler(sectors, "NAME_FRE")
+    if layers is None:
+        layers = list(LAYERS)
+
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+    timings = []
+
+    with ProcessPoolExecutor(
+        max_workers=processes, initializer=_init_worker, initargs=(sectors,)
+    ) as executor:
+        futures = []
+        for name in layers:
+            filename, feature_type = LAYERS[name]
+            futures.append(
+                executor.submit(
+                    _process_layer,
+                    name,
+                    os.path.join(input_dir, filename),
+                    feature_type,
+                    os.path.join(output_dir, f"{name}.{output_format}"),
+                    mode,
+                    chunksize,
+                )
+            )
+
+        for future in as_completed(futures):
+            name, rows, seconds = future.result()
+            print(f"{name}: {rows} elements in {seconds:.1f}s")
+            timings.append({"LAYER": name, "ROWS": rows, "SECONDS": seconds})
+
+    total = time.perf_counter() - start
+    print(f"Successfully processed {len(layers)} layers in {total:.1f}s.")
+    return pd.DataFrame(timings)
+
+
+if __name__ == "__main__":
+    run_pipeline(
+        "../data/osm/overpass-turbo",
+        "../data/final_data/osm",
+        "../data/final_data/sector.json",
+    )
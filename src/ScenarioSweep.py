@@ -0,0 +1,142 @@
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+# Local packages
+from DemandEstimator import ENERGY_PER_KM, DemandEstimator
+from GeoIO import save_frame
+
+# Parameter: default value
+PARAMETERS = {
+    "energy_per_km": ENERGY_PER_KM,  # kWh/km
+    "ppr_scale": 1.0,  # multiplies the parking (PPR) ratios
+    "indr_scale": 1.0,  # multiplies the INDR (car) ratios
+    "home_charging": 0.0,  # share of the vehicles with a private parking charging at home
+}
+
+# Arrays of the worker process, attached once to the shared memory when the process starts
+_shared = dict()
+_blocks = []
+
+
+def _init_worker(specs):
+    for key, (name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        _blocks.append(block)
+        _shared[key] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    # Kilometers travelled to each destination, identical for all the scenarios
+    _shared["km"] = (
+        (_shared["regular"] + _shared["irregular"]) * _shared["distances"]
+    ).sum(axis=0)
+
+
+def _evaluate(parameters):
+    """Public charging demand (kWh) of each sector, for a batch of scenarios (one row each).
+
+    demand = energy_per_km * km * car * (1 - home_charging * ppr), where car and ppr are the
+    scaled INDR and PPR ratios of the sector, clipped to [0, 1].
+    """
+    column = {key: parameters[key].to_numpy()[:, None] for key in PARAMETERS}
+    ppr = np.clip(column["ppr_scale"] * _shared["ppr"], 0, 1)
+    car = np.clip(column["indr_scale"] * _shared["indr"], 0, 1)
+    demand = (
+        column["energy_per_km"]
+        * _shared["km"]
+        * car
+        * (1 - column["home_charging"] * ppr)
+    )
+    return parameters.index, demand.astype(np.float32)
+
+
+def make_grid(grid):
+    """Returns one row per combination of the parameter values (missing parameters at their default).
+
+    Args:
+        grid ([Dict]): Parameter -> list of values (ex. {"energy_per_km": [0.15, 0.22]}).
+
+    Returns:
+        [Pandas DataFrame]: Scenarios, one column per parameter of PARAMETERS.
+    """
+    unknown = set(grid) - set(PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+
+    values = [grid.get(key, [default]) for key, default in PARAMETERS.items()]
+    scenarios = pd.DataFrame(list(itertools.product(*values)), columns=list(PARAMETERS))
+    scenarios.index.name = "SCENARIO"
+    return scenarios
+
+
+def run_sweep(
+    estimator: DemandEstimator, grid, processes=None, batch=50, output_path=None
+):
+    """Evaluates the public charging demand of every sector for each combination of parameters,
+    in parallel processes sharing the OD matrices through shared memory.
+
+    Args:
+        estimator (DemandEstimator): Estimator with its trips, distances and (optionally) PPR_Ratio
+            and INDR_Ratio ratios loaded.
+        grid ([Dict]): Parameter -> list of values (see make_grid and PARAMETERS).
+        processes ([int], optional): Number of processes. Defaults to the number of CPUs.
+        batch (int, optional): Number of scenarios evaluated per task. Defaults to 50.
+        output_path ([String], optional): Saves the results (see GeoIO.save_frame). Defaults to None.
+
+    Returns:
+        [Pandas DataFrame]: One row per scenario: its parameters, TOTAL demand and the demand of each sector.
+    """
+    start = time.perf_counter()
+    scenarios = make_grid(grid)
+    size = len(estimator.keys)
+    arrays = {
+        "regular": estimator.trips["regular"],
+        "irregular": estimator.trips["irregular"],
+        "distances": estimator.distances,
+        "ppr": _ratio(estimator, "PPR_Ratio", 0.0, size),
+        "indr": _ratio(estimator, "INDR_Ratio", 1.0, size),
+    }
+
+    blocks = []
+    try:
+        specs = dict()
+        for key, array in arrays.items():
+            array = np.ascontiguousarray(array, dtype=float)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+            blocks.append(block)
+            specs[key] = (block.name, array.shape, array.dtype)
+
+        demand = np.zeros((len(scenarios), size), dtype=np.float32)
+        with ProcessPoolExecutor(
+            max_workers=processes, initializer=_init_worker, initargs=(specs,)
+        ) as executor:
+            batches = [
+                scenarios.iloc[i : i + batch] for i in range(0, len(scenarios), batch)
+            ]
+            for index, values in executor.map(_evaluate, batches):
+                demand[index] = values
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    results = scenarios.reset_index()
+    results["TOTAL"] = demand.sum(axis=1)
+    results = pd.concat([results, pd.DataFrame(demand, columns=estimator.keys)], axis=1)
+
+    if output_path is not None:
+        save_frame(results, output_path)
+
+    total = time.perf_counter() - start
+    print(f"Successfully evaluated {len(scenarios)} scenarios in {total:.1f}s.")
+    return results
+
+
+def _ratio(estimator, column, default, size):
+    if column in estimator.ratios.columns:
+        return estimator.ratios[column].to_numpy(dtype=float)
+    return np.full(size, default)
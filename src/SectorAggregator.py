@@ -0,0 +1,166 @@
+import hashlib
+import os
+
+import pandas as pd
+
+# Local packages
+from GeoJsonHandler import GeoJsonHandler
+from GeoIO import load_frame, read_columns
+
+
+class SectorAggregator:
+    """Per-sector, per-layer counts, areas and lengths of OSM layers.
+
+    Each layer is aggregated on its own and only re-aggregated when its input changes,
+    so that refreshing one layer does not recompute the others. The aggregates can be
+    persisted in a cache directory to be reused across sessions.
+    """
+
+    # Statistic: (input column, aggregation)
+    STATISTICS = {
+        "TOTAL": (None, "size"),
+        "AREA": ("AREA", "sum"),
+        "LENGTH": ("length", "sum"),
+    }
+
+    def __init__(self, sectors: GeoJsonHandler, column="NAME_FRE", cache_dir=None):
+        """
+        Args:
+            sectors (GeoJsonHandler): Sectors on which the layers are aggregated.
+            column (str, optional): Column of the layers giving their sector. Defaults to "NAME_FRE".
+            cache_dir ([String], optional): Directory where the aggregates are persisted. Defaults to None.
+        """
+        self.sectors = sectors
+        self.column = column
+        self.cache_dir = cache_dir
+        self.layers = dict()
+        self._features = None
+        self.load_cache()
+
+    def cache_path(self):
+        """Path of the persisted aggregates, keyed by the sectors they were aggregated on.
+
+        Returns:
+            [String]: Path of the cache file, None when no cache directory is set.
+        """
+        if self.cache_dir is None:
+            return None
+        return os.path.join(
+            self.cache_dir, f"sector_aggregates_{self.sectors_key()[:16]}.pkl"
+        )
+
+    def sectors_key(self):
+        """[String]: Hash of the sector names, in order (the index of the statistics)."""
+        names = "\n".join(map(str, self.sectors.gdf[self.sectors.name]))
+        return hashlib.sha1(names.encode("utf-8")).hexdigest()
+
+    def load_cache(self):
+        """Loads the persisted aggregates, dropping them if they were aggregated on other sectors."""
+        cache_path = self.cache_path()
+        if cache_path is None or not os.path.exists(cache_path):
+            return
+
+        cache = pd.read_pickle(cache_path)
+        if not isinstance(cache, dict) or cache.get("sectors") != self.sectors_key():
+            print(f"Warning: {cache_path} was built on other sectors, dropping it.")
+            os.remove(cache_path)
+            return
+        self.layers = cache["layers"]
+
+    def save_cache(self):
+        cache_path = self.cache_path()
+        if cache_path is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache = {"sectors": self.sectors_key(), "layers": self.layers}
+        pd.to_pickle(cache, cache_path + ".tmp")
+        os.replace(cache_path + ".tmp", cache_path)
+
+    def update_layer(self, name, source):
+        """Aggregates a layer on the sectors, unless its input did not change since the last update.
+
+        Args:
+            name ([String]): Name of the layer (ex. "health").
+            source ([String or DataFrame]): Layer file saved by OSMGeoJsonHandler.save, or a
+                DataFrame with the sector column and optionally AREA and length columns.
+
+        Returns:
+            [Boolean]: True if the layer was (re)aggregated.
+        """
+        fingerprint = self.fingerprint(source)
+        if name in self.layers and self.layers[name]["fingerprint"] == fingerprint:
+            return False
+
+        if isinstance(source, str):
+            # Only the columns used by the aggregation are read
+            wanted = [self.column] + [c for c, _ in self.STATISTICS.values() if c]
+            available = read_columns(source)
+            data = load_frame(source, columns=[c for c in wanted if c in available])
+        else:
+            data = source
+
+        self.layers[name] = {
+            "fingerprint": fingerprint,
+            "statistics": self.aggregate(data),
+        }
+        self._features = None
+        self.save_cache()
+        return True
+
+    def remove_layer(self, name):
+        if self.layers.pop(name, None) is not None:
+            self._features = None
+            self.save_cache()
+
+    def aggregate(self, data):
+        """Computes the statistics of one layer for every sector, in a single groupby.
+
+        Args:
+            data ([DataFrame]): Layer with the sector column and optionally AREA and length columns.
+
+        Returns:
+            [DataFrame]: One row per sector (in the order of the sectors), one column per statistic.
+        """
+        aggregations = dict()
+        for statistic, (column, function) in self.STATISTICS.items():
+            if column is None:
+                aggregations[statistic] = (self.column, function)
+            elif column in data.columns:
+                aggregations[statistic] = (column, function)
+
+        data = data[data[self.column].notna() & (data[self.column] != "")]
+        statistics = data.groupby(self.column).agg(**aggregations)
+        return statistics.reindex(self.sectors.gdf[self.sectors.name], fill_value=0)
+
+    def fingerprint(self, source):
+        if isinstance(source, str):
+            stat = os.stat(source)
+            return (os.path.abspath(source), stat.st_mtime, stat.st_size)
+
+        columns = [self.column] + [
+            c for c, _ in self.STATISTICS.values() if c and c in source.columns
+        ]
+        hashes = pd.util.hash_pandas_object(source[columns], index=False)
+        return hashlib.sha1(hashes.to_numpy().tobytes()).hexdigest()
+
+    def features(self):
+        """Returns the statistics of all the layers as one table, columns named STATISTIC_layer
+        (ex. TOTAL_health, LENGTH_residential-lanes). Rebuilt only when a layer changed.
+
+        Returns:
+            [DataFrame]: One row per sector, with the sector column first.
+        """
+        if self._features is None:
+            blocks = []
+            for name, layer in self.layers.items():
+                block = layer["statistics"].copy()
+                block.columns = [f"{statistic}_{name}" for statistic in block.columns]
+                blocks.append(block)
+
+            index = self.sectors.gdf[self.sectors.name]
+            features = (
+                pd.concat(blocks, axis=1) if blocks else pd.DataFrame(index=index)
+            )
+            features.index.name = self.sectors.name
+            self._features = features.reset_index()
+        return self._features
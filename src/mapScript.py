@@ -63,20 +63,30 @@ print("Number of Neighborhoods in Proximus Dataset: ", len(df['originNB'].unique
 
 origin = "ALTITUDE 100"
 
-for origin in tqdm(df['originNB'].unique()):
-    # Adding the population value to each sector of the geojson file
-    subdf = df[df["originNB"] == "ALTITUDE 100"]
-    for index in range(len(sectors_json["features"])):
-        temp_dict = sectors_json["features"][index]["properties"]    
-        val = subdf[subdf["destinationNB"] == temp_dict["NAME_FRE"]]["regularTripSample"]
-        if val.empty:
-            val = 0
-        else:
-            val = val.item()
-        temp_dict[f"RegularTrips_From_{origin}"] = f"Regular Trips From {origin}: " + str(
+# Regular trips of every origin towards every destination, in one pivot
+trips = (
+    df.pivot_table(
+        index="destinationNB",
+        columns="originNB",
+        values="regularTripSample",
+        aggfunc="first",
+    )
+    .fillna(0)
+    .astype(df["regularTripSample"].dtype)
+)
+subdf = df[df["originNB"] == origin]
+
+# Adding the values to each sector of the geojson file, in a single pass
+for feature in tqdm(sectors_json["features"]):
+    temp_dict = feature["properties"]
+    if temp_dict["NAME_FRE"] in trips.index:
+        row = trips.loc[temp_dict["NAME_FRE"]]
+    else:
+        row = pd.Series(0, index=trips.columns)
+    for orig, val in row.items():
+        temp_dict[f"RegularTrips_From_{orig}"] = f"Regular Trips From {orig}: " + str(
             val
         )
-        sectors_json["features"][index]["properties"] = temp_dict
 
 
 # In[117]:
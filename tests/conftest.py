@@ -0,0 +1,31 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+
+def square(x, y, size=0.01):
+    return [[[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]]]
+
+
+@pytest.fixture
+def sectors_path(tmp_path):
+    """2 x 2 grid of sectors around Brussels, named S00, S01, S10, S11."""
+    features = [
+        {
+            "type": "Feature",
+            "properties": {"NAME_FRE": f"S{i}{j}"},
+            "geometry": {
+                "type": "Polygon",
+                "coordinates": square(4.35 + 0.01 * i, 50.84 + 0.01 * j),
+            },
+        }
+        for i in range(2)
+        for j in range(2)
+    ]
+    path = tmp_path / "sectors.json"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": features}))
+    return str(path)
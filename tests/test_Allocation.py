@@ -0,0 +1,44 @@
+import itertools
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Allocation import ChargingAllocator
+from GeoJsonHandler import GeoJsonHandler
+
+
+@pytest.fixture
+def allocator(sectors_path):
+    sectors = GeoJsonHandler(sectors_path, "NAME_FRE")
+    sectors.add_properties(
+        pd.DataFrame({"NAME_FRE": sectors.names, "totalDemand": [10, 40, 20, 30]}),
+        ["totalDemand"],
+        verbose=False,
+    )
+    rng = np.random.default_rng(0)
+    sites = types.SimpleNamespace(
+        gdf=pd.DataFrame(
+            {
+                "LON": rng.uniform(4.35, 4.37, 12),
+                "LAT": rng.uniform(50.84, 50.86, 12),
+                "ID": [str(i) for i in range(12)],
+            }
+        )
+    )
+    return ChargingAllocator(sectors, sites, radius=1500)
+
+
+def test_solve_exact_reports_gap(allocator):
+    pytest.importorskip("mip")
+    selected = allocator.solve_exact(2, verbose=False)
+
+    cost = allocator.distance
+    best = min(
+        allocator.objective(list(sites), cost, 1500.0)
+        for sites in itertools.combinations(range(12), 2)
+    )
+    assert allocator.objective(selected, cost, 1500.0) == pytest.approx(best)
+    assert allocator.solution["status"] == "OPTIMAL"
+    assert allocator.solution["gap"] == pytest.approx(0, abs=1e-6)
@@ -0,0 +1,52 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import Polygon
+
+from BrusselsMap import BrusselsMap
+from GeoJsonHandler import GeoJsonHandler
+
+
+@pytest.fixture
+def brussels_map(sectors_path):
+    return BrusselsMap(GeoJsonHandler(sectors_path, "NAME_FRE"), tiles=False)
+
+
+def neighbours():
+    # Two parcels sharing an irregular border, the north ring starting half-way along it
+    rng = np.random.default_rng(1)
+    x = np.linspace(4.35, 4.36, 41)
+    border = list(zip(x, 50.84 + rng.uniform(0, 0.0008, len(x))))
+    south = Polygon([(4.35, 50.83)] + border + [(4.36, 50.83)])
+    north = Polygon(border[20:] + [(4.36, 50.85), (4.35, 50.85)] + border[:21])
+    return gpd.GeoDataFrame(geometry=[south, north], crs="EPSG:4326")
+
+
+@pytest.mark.skipif(not hasattr(shapely, "coverage_simplify"), reason="shapely < 2.1")
+def test_simplified_keeps_shared_borders(brussels_map):
+    data = neighbours()
+
+    simplified = brussels_map.simplified(data, "low")
+
+    assert simplified[0].intersection(simplified[1]).area == pytest.approx(0)
+    assert simplified.union_all().area == pytest.approx(data.union_all().area)
+    assert len(simplified[0].exterior.coords) < len(data.geometry[0].exterior.coords)
+
+
+def test_only_sectors_are_cached(brussels_map):
+    brussels_map.simplified(neighbours(), "medium")
+    sectors = brussels_map.simplified(brussels_map.geojson.geometries, "medium")
+
+    assert list(brussels_map._simplified) == ["medium"]
+    assert brussels_map.simplified(brussels_map.geojson.geometries, "medium") is sectors
+
+
+def test_add_geometries_reprojects(brussels_map):
+    data = neighbours().assign(kind=["a", "b"])
+
+    brussels_map.add_geometries(data.to_crs(31370), column="kind", level="full")
+
+    layer = list(brussels_map.map._children.values())[-1]
+    bounds = np.array(layer.get_bounds())
+    np.testing.assert_allclose(bounds, [[50.83, 4.35], [50.85, 4.36]], atol=1e-6)
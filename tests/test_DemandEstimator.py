@@ -0,0 +1,132 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from DemandEstimator import DemandEstimator
+from DistanceMatrix import DistanceMatrix
+from GeoJsonHandler import GeoJsonHandler
+
+
+@pytest.fixture
+def estimator(sectors_path):
+    return DemandEstimator(GeoJsonHandler(sectors_path, "NAME_FRE"))
+
+
+def test_missing_sector_in_distances_raises(estimator):
+    names = ["S00", "S01", "S10", "S99"]
+    distances = pd.DataFrame(np.ones((4, 4)), index=names, columns=names)
+
+    with pytest.raises(ValueError, match="S11"):
+        estimator.load_distances(distances)
+
+
+def test_only_missing_values_are_filled(estimator):
+    names = ["S00", "S01", "S10", "S11"]
+    distances = pd.DataFrame(np.ones((4, 4)), index=names, columns=names)
+    distances.iloc[0, 1] = np.nan
+
+    estimator.load_distances(distances)
+
+    assert estimator.distances[0, 1] == 0
+    assert estimator.distances.sum() == 15
+
+
+def test_distance_matrix_matches_unnormalized_names(sectors_path):
+    with open(sectors_path) as f:
+        data = json.load(f)
+    data["features"][1]["properties"]["NAME_FRE"] = "S  01 "
+    with open(sectors_path, "w") as f:
+        json.dump(data, f)
+    sectors = GeoJsonHandler(sectors_path, "NAME_FRE")
+
+    distances, _ = DistanceMatrix(sectors).to_frames()
+    estimator = DemandEstimator(sectors)
+    estimator.load_distances(distances)
+    estimator.load_trips(
+        pd.DataFrame(
+            {
+                "originNB": ["S00", "S 01"],
+                "destinationNB": ["S 01", "S00"],
+                "regularTripSample": [10.0, 20.0],
+                "irregularTripSample": [0.0, 0.0],
+            }
+        )
+    )
+    estimator.add_to_sectors(verbose=False)
+
+    assert (estimator.distances[~np.eye(4, dtype=bool)] > 0).all()
+    demand = sectors.gdf.set_index("NAME_FRE")["regularDemand"]
+    assert demand["S  01 "] == pytest.approx(10 * estimator.distances[0, 1])
+    assert demand["S00"] == pytest.approx(20 * estimator.distances[1, 0])
+
+
+def test_unknown_sector_in_trips_raises(estimator):
+    trips = pd.DataFrame(
+        {
+            "originNB": ["S00", "S99"],
+            "destinationNB": ["S01", "S00"],
+            "regularTripSample": [10.0, 20.0],
+            "irregularTripSample": [0.0, 0.0],
+        }
+    )
+
+    with pytest.raises(ValueError, match="S99"):
+        estimator.load_trips(trips)
+
+
+@pytest.fixture
+def loaded(estimator):
+    rng = np.random.default_rng(0)
+    names = estimator.keys
+    estimator.load_distances(
+        pd.DataFrame(rng.uniform(1, 5, (4, 4)), index=names, columns=names)
+    )
+    origin, destination = np.meshgrid(names, names, indexing="ij")
+    estimator.load_trips(
+        pd.DataFrame(
+            {
+                "originNB": origin.ravel(),
+                "destinationNB": destination.ravel(),
+                "regularTripSample": rng.uniform(0, 50, 16),
+                "irregularTripSample": rng.uniform(0, 5, 16),
+            }
+        )
+    )
+    return estimator
+
+
+@pytest.mark.parametrize("distribution", ["poisson", "negative_binomial"])
+def test_simulate_reproducible_and_independent_of_chunk(loaded, distribution):
+    first = loaded.simulate(draws=50, distribution=distribution, chunk=7, seed=1)
+    again = loaded.simulate(draws=50, distribution=distribution, chunk=7, seed=1)
+    whole = loaded.simulate(draws=50, distribution=distribution, chunk=50, seed=1)
+    other = loaded.simulate(draws=50, distribution=distribution, chunk=7, seed=2)
+
+    pd.testing.assert_frame_equal(first, again)
+    pd.testing.assert_frame_equal(first, whole)
+    assert not first.equals(other)
+
+
+def test_simulate_mean_converges_to_demand(loaded):
+    simulated = loaded.simulate(
+        draws=4000, distribution="negative_binomial", dispersion=2.0, seed=0
+    )
+    demand = loaded.demand()
+
+    for trip_type in ["regular", "irregular"]:
+        np.testing.assert_allclose(
+            simulated[f"{trip_type}EnergyDemand_mean"],
+            demand[f"{trip_type}EnergyDemand"],
+            rtol=0.03,
+        )
+
+
+def test_simulate_quantile_columns_are_distinct(loaded):
+    simulated = loaded.simulate(draws=20, quantiles=(0.02, 0.025, 0.5), seed=0)
+
+    assert simulated.columns.is_unique
+    assert {"totalEnergyDemand_q0.02", "totalEnergyDemand_q0.025"} <= set(
+        simulated.columns
+    )
@@ -0,0 +1,72 @@
+import geopandas as gpd
+import pandas as pd
+import pytest
+from shapely.geometry import LineString, Point
+
+from GeoIO import load_frame, read_columns, save_frame
+
+
+def layer_path(tmp_path, extension):
+    if extension != ".csv":
+        # GeoParquet and Feather need the optional pyarrow
+        pytest.importorskip("pyarrow")
+    return str(tmp_path / f"layer{extension}")
+
+
+@pytest.fixture
+def frame():
+    return gpd.GeoDataFrame(
+        {
+            "NAME_FRE": ["S00", "S01", "S10"],
+            "AREA": [1.5, 0.0, 2.25],
+            "geometry": [
+                Point(4.35, 50.84),
+                None,
+                LineString([(4.35, 50.84), (4.36, 50.85)]),
+            ],
+        },
+        crs="EPSG:4326",
+    )
+
+
+@pytest.mark.parametrize("extension", [".csv", ".parquet", ".feather"])
+def test_round_trip(tmp_path, frame, extension):
+    path = layer_path(tmp_path, extension)
+
+    save_frame(frame, path)
+    loaded = load_frame(path)
+
+    assert isinstance(loaded, gpd.GeoDataFrame)
+    assert loaded.crs == frame.crs
+    assert loaded.geometry.isna().tolist() == [False, True, False]
+    assert loaded.geometry[0].equals(frame.geometry[0])
+    assert loaded.geometry[2].equals(frame.geometry[2])
+    pd.testing.assert_frame_equal(
+        pd.DataFrame(loaded.drop(columns="geometry")),
+        pd.DataFrame(frame.drop(columns="geometry")),
+    )
+    assert read_columns(path) == ["NAME_FRE", "AREA", "geometry"]
+
+
+@pytest.mark.parametrize("extension", [".parquet", ".feather"])
+def test_binary_formats_keep_projected_crs(tmp_path, frame, extension):
+    path = layer_path(tmp_path, extension)
+
+    save_frame(frame.to_crs(31370), path)
+
+    assert load_frame(path).crs == "EPSG:31370"
+
+
+@pytest.mark.parametrize("extension", [".csv", ".parquet", ".feather"])
+def test_column_projection(tmp_path, frame, extension):
+    path = layer_path(tmp_path, extension)
+    save_frame(frame, path)
+
+    values = load_frame(path, columns=["NAME_FRE", "AREA"])
+    shapes = load_frame(path, columns=["NAME_FRE", "geometry"])
+
+    assert type(values) is pd.DataFrame
+    assert list(values.columns) == ["NAME_FRE", "AREA"]
+    assert isinstance(shapes, gpd.GeoDataFrame)
+    assert list(shapes.columns) == ["NAME_FRE", "geometry"]
+    assert shapes.crs == "EPSG:4326"
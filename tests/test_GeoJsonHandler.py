@@ -0,0 +1,65 @@
+import os
+import json
+
+import pandas as pd
+
+import GeoJsonHandler as module
+from GeoJsonHandler import GeoJsonHandler
+
+
+def test_add_centers_with_duplicated_names(sectors_path):
+    with open(sectors_path) as f:
+        data = json.load(f)
+    data["features"][1]["properties"]["NAME_FRE"] = "S00"
+    with open(sectors_path, "w") as f:
+        json.dump(data, f)
+
+    sectors = GeoJsonHandler(sectors_path, "NAME_FRE")
+
+    assert list(sectors.gdf["CENTER_LAT"].round(3)) == [50.845, 50.855, 50.845, 50.855]
+
+
+def test_corrupted_cache_is_rebuilt(sectors_path, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    sectors = GeoJsonHandler(sectors_path, "NAME_FRE", cache_dir=cache_dir)
+    with open(sectors.cache_path(), "wb") as f:
+        f.write(b"truncated")
+
+    sectors = GeoJsonHandler(sectors_path, "NAME_FRE", cache_dir=cache_dir)
+
+    assert sectors.names == ["S00", "S01", "S10", "S11"]
+    assert GeoJsonHandler(sectors_path, "NAME_FRE", cache_dir=cache_dir).load_cache()
+
+
+def test_cache_mtime_updated_after_hash_match(sectors_path, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    GeoJsonHandler(sectors_path, "NAME_FRE", cache_dir=cache_dir)
+    os.utime(sectors_path, (0, 0))
+    GeoJsonHandler(sectors_path, "NAME_FRE", cache_dir=cache_dir)
+
+    def fail(path):
+        raise AssertionError("source hashed again")
+
+    monkeypatch.setattr(module, "_file_sha1", fail)
+    sectors = GeoJsonHandler(sectors_path, "NAME_FRE", cache_dir=cache_dir)
+    assert len(sectors.gdf) == 4
+
+
+def test_cached_sectors_match_parsed_sectors(sectors_path, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    parsed = GeoJsonHandler(sectors_path, "NAME_FRE", cache_dir=cache_dir)
+
+    cached = GeoJsonHandler(sectors_path, "NAME_FRE", cache_dir=cache_dir)
+
+    assert cached.load_cache()
+    assert sorted(os.listdir(cache_dir)) == sorted(
+        [os.path.basename(parsed.cache_path()), os.path.basename(parsed.meta_path())]
+    )
+    assert parsed.cache_path().endswith(".parquet")
+    assert cached.gdf.crs == parsed.gdf.crs
+    assert cached.geometries.geom_equals(parsed.geometries).all()
+    assert cached.names == parsed.names
+    pd.testing.assert_frame_equal(
+        pd.DataFrame(cached.gdf.drop(columns="geometry")),
+        pd.DataFrame(parsed.gdf.drop(columns="geometry")),
+    )
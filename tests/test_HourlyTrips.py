@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from DemandEstimator import ENERGY_PER_KM, DemandEstimator
+from GeoJsonHandler import GeoJsonHandler
+from HourlyTrips import HOURS, HourlyTrips
+
+
+def test_from_csv_keeps_fractional_trips(tmp_path):
+    names = ["S00", "S01", "S10"]
+    rng = np.random.default_rng(0)
+    origin, destination, hour = np.meshgrid(
+        range(len(names)), range(len(names)), range(HOURS), indexing="ij"
+    )
+    data = pd.DataFrame(
+        {
+            "originNB": np.array(names)[origin.ravel()],
+            "destinationNB": np.array(names)[destination.ravel()],
+            "arrival_hr": hour.ravel(),
+            "regularTripSample": rng.uniform(0, 40000, origin.size),
+            "irregularTripSample": rng.uniform(0, 10, origin.size),
+        }
+    )
+    data.loc[0, "regularTripSample"] = 30750.3
+    path = tmp_path / "hourly.csv"
+    data.to_csv(path, index=False)
+
+    hourly = HourlyTrips.from_csv(str(path), str(tmp_path / "arrays"), chunksize=50)
+    reopened = HourlyTrips(str(tmp_path / "arrays"))
+
+    assert reopened.trips["regular"][0, 0, 0] == 30750.3
+    np.testing.assert_allclose(
+        reopened.trips["regular"].ravel(), data["regularTripSample"].to_numpy()
+    )
+    np.testing.assert_allclose(
+        hourly.trips["irregular"].ravel(), data["irregularTripSample"].to_numpy()
+    )
+
+
+def test_energy_demand_aligns_distances_by_name(tmp_path, sectors_path):
+    # Origins in another order than the sectors, one label not normalized
+    labels = ["S11", " S10 ", "S00", "S01"]
+    names = ["S11", "S10", "S00", "S01"]
+    rng = np.random.default_rng(0)
+    origin, destination, hour = np.meshgrid(
+        range(4), range(4), range(HOURS), indexing="ij"
+    )
+    data = pd.DataFrame(
+        {
+            "originNB": np.array(labels)[origin.ravel()],
+            "destinationNB": np.array(names)[destination.ravel()],
+            "arrival_hr": hour.ravel(),
+            "regularTripSample": rng.uniform(0, 100, origin.size),
+            "irregularTripSample": rng.uniform(0, 10, origin.size),
+        }
+    )
+    path = tmp_path / "hourly.csv"
+    data.to_csv(path, index=False)
+
+    sectors = GeoJsonHandler(sectors_path, "NAME_FRE")
+    distances = pd.DataFrame(
+        rng.uniform(1, 5, (4, 4)), index=sectors.names, columns=sectors.names
+    )
+    estimator = DemandEstimator(sectors)
+    estimator.load_distances(distances)
+
+    hourly = HourlyTrips.from_csv(str(path), str(tmp_path / "arrays"))
+    demand = hourly.energy_demand(estimator)
+
+    assert hourly.names == names
+    data["distance"] = [
+        distances.loc[o.strip(), d]
+        for o, d in zip(data["originNB"], data["destinationNB"])
+    ]
+    expected = (
+        (data["regularTripSample"] * data["distance"] * ENERGY_PER_KM)
+        .groupby([data["destinationNB"], data["arrival_hr"]])
+        .sum()
+        .unstack()
+    )
+    pd.testing.assert_frame_equal(
+        demand["regular"].loc[sectors.names],
+        expected.loc[sectors.names],
+        check_names=False,
+    )
+    pd.testing.assert_frame_equal(
+        hourly.energy_demand(distances)["total"], demand["total"]
+    )
+
+
+def test_energy_demand_requires_labels(tmp_path):
+    hourly = HourlyTrips.create(str(tmp_path), ["S00", "S01"])
+
+    with pytest.raises(TypeError):
+        hourly.energy_demand(np.ones((2, 2)))
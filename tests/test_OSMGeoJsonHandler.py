@@ -0,0 +1,133 @@
+import json
+import warnings
+
+import pytest
+from shapely.geometry import LineString
+
+from GeoJsonHandler import GeoJsonHandler
+import OSMGeoJsonHandler as module
+from conftest import square
+from OSMGeoJsonHandler import OSMGeoJsonHandler
+
+
+def line(x, y, length=0.01):
+    return {"type": "LineString", "coordinates": [[x, y], [x + length, y]]}
+
+
+@pytest.fixture
+def lanes_path(tmp_path):
+    features = [
+        {
+            "type": "Feature",
+            "properties": {"@id": f"way/{i}", "name": f"Street {i}"},
+            "geometry": line(4.35, 50.84 + 0.001 * i),
+        }
+        for i in range(3)
+    ]
+    path = tmp_path / "lanes.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": features}))
+    return str(path)
+
+
+def test_projected_geometry_follows_replaced_geometry(lanes_path):
+    lanes = OSMGeoJsonHandler(lanes_path, "lanes")
+    before = lanes.projected_geometry().length.to_numpy()
+
+    lanes.gdf["geometry"] = [
+        LineString([(4.35, 50.84), (4.37, 50.84)]) for _ in range(len(lanes.gdf))
+    ]
+    after = lanes.projected_geometry().length.to_numpy()
+
+    assert after == pytest.approx(2 * before, rel=1e-3)
+
+
+def test_projected_geometry_reused_for_subsets(lanes_path):
+    lanes = OSMGeoJsonHandler(lanes_path, "lanes")
+    projected = lanes.projected_geometry()
+    lanes.gdf = lanes.gdf.iloc[1:]
+
+    assert lanes.projected_geometry().iloc[0] is projected.iloc[1]
+
+
+def test_iter_features_with_features_larger_than_buffer(tmp_path, monkeypatch):
+    coordinates = [[4.35 + 1e-5 * i, 50.84] for i in range(5000)]
+    features = [
+        {
+            "type": "Feature",
+            "properties": {"@id": f"way/{i}"},
+            "geometry": {"type": "LineString", "coordinates": coordinates},
+        }
+        for i in range(3)
+    ]
+    path = tmp_path / "large.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": features}))
+
+    decodes = []
+    decoder = json.JSONDecoder()
+
+    class CountingDecoder:
+        def raw_decode(self, s, idx=0):
+            decodes.append(idx)
+            return decoder.raw_decode(s, idx)
+
+    monkeypatch.setattr(module.json, "JSONDecoder", CountingDecoder)
+    chunks = list(module._iter_features(str(path), chunksize=2, buffer_size=64))
+
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert chunks[1][0]["geometry"]["coordinates"] == coordinates
+    # Each ~130 kB feature is retried about log2(130000 / 64) times, not 2000 times
+    assert len(decodes) < 3 * 20
+
+
+def test_missing_id_raises(tmp_path):
+    features = [
+        {
+            "type": "Feature",
+            "properties": {"@id": "way/1", "name": "A"},
+            "geometry": line(4.35, 50.84),
+        },
+        {"type": "Feature", "properties": {"name": "B"}, "geometry": line(4.35, 50.85)},
+    ]
+    path = tmp_path / "lanes.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": features}))
+
+    with pytest.raises(ValueError, match="'@id'.*'lanes' schema"):
+        OSMGeoJsonHandler(str(path), "lanes")
+
+
+def test_overlap_assignment_has_sector_crs(lanes_path, sectors_path):
+    lanes = OSMGeoJsonHandler(lanes_path, "lanes")
+    sectors = GeoJsonHandler(sectors_path, "NAME_FRE")
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        lanes.assign_ngh(sectors, mode="overlap")
+
+    assert lanes.gdf.crs == sectors.geometries.crs
+    assert list(lanes.gdf["NAME_FRE"]) == ["S00", "S00", "S00"]
+
+
+def test_null_areas_filled_with_median(tmp_path):
+    features = [
+        {
+            "type": "Feature",
+            "properties": {"id": f"node/{i}", "amenity": "hospital"},
+            "geometry": {"type": "Point", "coordinates": [4.35, 50.84]},
+        }
+        for i in range(2)
+    ] + [
+        {
+            "type": "Feature",
+            "properties": {"id": f"way/{i + 2}", "amenity": "hospital"},
+            "geometry": {"type": "Polygon", "coordinates": square(4.35, 50.84, size)},
+        }
+        for i, size in enumerate([0.001, 0.002, 0.003])
+    ]
+    path = tmp_path / "health.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": features}))
+
+    health = OSMGeoJsonHandler(str(path), "health")
+
+    areas = health.gdf.set_index("ID")["AREA"]
+    assert (areas > 0).all()
+    assert areas["0"] == areas["1"] == areas["3"]
@@ -0,0 +1,48 @@
+import json
+import os
+
+import pandas as pd
+
+from OSMGeoJsonHandler import FEATURE_SCHEMAS
+from OSMPipeline import LAYERS, run_pipeline
+
+
+def square(x, y, size=0.001):
+    return [[[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]]]
+
+
+def write_export(path, id_key, count):
+    features = [
+        {
+            "type": "Feature",
+            "properties": {id_key: f"way/{i}", "name": f"Place {i}"},
+            "geometry": {
+                "type": "Polygon",
+                "coordinates": square(4.351 + 0.002 * i, 50.841),
+            },
+        }
+        for i in range(count)
+    ]
+    with open(path, "w") as f:
+        json.dump({"type": "FeatureCollection", "features": features}, f)
+
+
+def test_pipeline_keeps_every_feature(sectors_path, tmp_path):
+    input_dir = tmp_path / "exports"
+    input_dir.mkdir()
+    counts = dict()
+    for i, (name, (filename, feature_type)) in enumerate(LAYERS.items()):
+        counts[name] = 2 + i
+        write_export(
+            input_dir / filename, FEATURE_SCHEMAS[feature_type]["id"], counts[name]
+        )
+    # The real residential export is keyed on "id"
+    write_export(input_dir / "residential.geojson", "id", counts["residential"])
+
+    output_dir = tmp_path / "outputs"
+    timings = run_pipeline(str(input_dir), str(output_dir), sectors_path, processes=2)
+
+    rows = timings.set_index("LAYER")["ROWS"].to_dict()
+    assert rows == counts
+    for name in LAYERS:
+        assert len(pd.read_csv(os.path.join(output_dir, f"{name}.csv"))) == counts[name]
@@ -0,0 +1,98 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import ScenarioSweep
+from DemandEstimator import DemandEstimator
+from GeoJsonHandler import GeoJsonHandler
+from ScenarioSweep import make_grid, run_sweep
+
+
+@pytest.fixture
+def estimator(sectors_path):
+    estimator = DemandEstimator(GeoJsonHandler(sectors_path, "NAME_FRE"))
+    rng = np.random.default_rng(0)
+    names = estimator.keys
+    estimator.load_distances(
+        pd.DataFrame(rng.uniform(1, 5, (4, 4)), index=names, columns=names)
+    )
+    origin, destination = np.meshgrid(names, names, indexing="ij")
+    estimator.load_trips(
+        pd.DataFrame(
+            {
+                "originNB": origin.ravel(),
+                "destinationNB": destination.ravel(),
+                "regularTripSample": rng.uniform(0, 100, 16),
+                "irregularTripSample": rng.uniform(0, 10, 16),
+            }
+        )
+    )
+    ratios = pd.DataFrame(
+        {"NAME_FRE": names, "ppr": [0.2, 0.5, 0.8, 0.9], "indr": [0.3, 0.6, 0.7, 1.0]}
+    )
+    estimator.add_ratios(ratios, {"ppr": "PPR_Ratio", "indr": "INDR_Ratio"})
+    return estimator
+
+
+def test_run_sweep_matches_direct_evaluation(estimator, monkeypatch):
+    created = []
+
+    class RecordedSharedMemory(shared_memory.SharedMemory):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            if kwargs.get("create"):
+                created.append(self.name)
+
+    monkeypatch.setattr(
+        ScenarioSweep.shared_memory, "SharedMemory", RecordedSharedMemory
+    )
+    grid = {
+        "energy_per_km": [0.15, 0.22],
+        "ppr_scale": [0.5, 2.0],
+        "home_charging": [0.0, 0.4, 1.0],
+    }
+
+    results = run_sweep(estimator, grid, processes=2, batch=5)
+
+    scenarios = make_grid(grid)
+    km = (
+        (estimator.trips["regular"] + estimator.trips["irregular"])
+        * estimator.distances
+    ).sum(axis=0)
+    ppr = np.clip(
+        scenarios[["ppr_scale"]].to_numpy() * estimator.ratios["PPR_Ratio"].to_numpy(),
+        0,
+        1,
+    )
+    car = np.clip(
+        scenarios[["indr_scale"]].to_numpy()
+        * estimator.ratios["INDR_Ratio"].to_numpy(),
+        0,
+        1,
+    )
+    expected = (
+        scenarios[["energy_per_km"]].to_numpy()
+        * km
+        * car
+        * (1 - scenarios[["home_charging"]].to_numpy() * ppr)
+    )
+
+    assert len(results) == 12
+    np.testing.assert_allclose(results[estimator.keys].to_numpy(), expected, rtol=1e-6)
+    np.testing.assert_allclose(results["TOTAL"], expected.sum(axis=1), rtol=1e-6)
+    pd.testing.assert_frame_equal(
+        results[list(ScenarioSweep.PARAMETERS)], scenarios.reset_index(drop=True)
+    )
+
+    # The shared blocks are released once the sweep is over
+    assert len(created) == 5
+    for name in created:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+
+def test_make_grid_rejects_unknown_parameters():
+    with pytest.raises(ValueError, match="speed"):
+        make_grid({"energy_per_km": [0.2], "speed": [50]})
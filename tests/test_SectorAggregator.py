@@ -0,0 +1,60 @@
+import json
+
+import pandas as pd
+
+from GeoJsonHandler import GeoJsonHandler
+from SectorAggregator import SectorAggregator
+
+
+def layer(sectors, lengths):
+    return pd.DataFrame({"NAME_FRE": sectors, "length": lengths})
+
+
+def test_only_changed_layer_is_reaggregated(sectors_path, monkeypatch):
+    aggregator = SectorAggregator(GeoJsonHandler(sectors_path, "NAME_FRE"))
+    aggregated = []
+    aggregate = aggregator.aggregate
+    monkeypatch.setattr(
+        aggregator,
+        "aggregate",
+        lambda data: aggregated.append(len(data)) or aggregate(data),
+    )
+
+    assert aggregator.update_layer("lanes", layer(["S00", "S01"], [1.0, 2.0]))
+    assert aggregator.update_layer("parks", layer(["S10"], [5.0]))
+    parks = aggregator.layers["parks"]["statistics"]
+    aggregator.features()
+
+    assert not aggregator.update_layer("lanes", layer(["S00", "S01"], [1.0, 2.0]))
+    assert aggregator.update_layer("lanes", layer(["S00", "S01", "S11"], [1, 2, 3.0]))
+    assert not aggregator.update_layer("parks", layer(["S10"], [5.0]))
+
+    assert aggregated == [2, 1, 3]
+    assert aggregator.layers["parks"]["statistics"] is parks
+    features = aggregator.features().set_index("NAME_FRE")
+    assert features.loc["S11", "LENGTH_lanes"] == 3
+    assert features.loc["S10", "TOTAL_parks"] == 1
+
+
+def test_cache_is_keyed_on_sectors(sectors_path, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    sectors = GeoJsonHandler(sectors_path, "NAME_FRE")
+    aggregator = SectorAggregator(sectors, cache_dir=cache_dir)
+    aggregator.update_layer("lanes", layer(["S00", "S01"], [1.0, 2.0]))
+
+    # Same sectors: the layer is reused
+    reloaded = SectorAggregator(sectors, cache_dir=cache_dir)
+    assert not reloaded.update_layer("lanes", layer(["S00", "S01"], [1.0, 2.0]))
+
+    # Other sectors sharing the cache directory: nothing is reused
+    with open(sectors_path) as f:
+        data = json.load(f)
+    data["features"][0]["properties"]["NAME_FRE"] = "S99"
+    other_path = tmp_path / "other.json"
+    other_path.write_text(json.dumps(data))
+    other = SectorAggregator(
+        GeoJsonHandler(str(other_path), "NAME_FRE"), cache_dir=cache_dir
+    )
+    assert other.layers == {}
+    assert other.update_layer("lanes", layer(["S99", "S01"], [1.0, 2.0]))
+    assert other.features().set_index("NAME_FRE").loc["S99", "LENGTH_lanes"] == 1